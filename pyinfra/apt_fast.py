@@ -65,9 +65,61 @@ apt_fast.packages(
 )
 ```
 
+Coalescing installs across deploys:
+```python
+# Each deferred call only records its packages...
+apt_fast.packages(name="Install dev tools", packages=["git"], coalesce=True, _sudo=True)
+apt_fast.packages(name="Install fonts", packages=["fonts-inter"], coalesce=True, _sudo=True)
+
+# ...until a flush installs all of them in one apt-fast transaction
+apt_fast.flush(name="Install deferred APT packages", parallel=16, _sudo=True)
+```
+
+Prefetching downloads:
+```python
+# Starts downloading everything later apt_fast.packages calls will install
+apt_fast.prefetch(name="Prefetch APT packages", parallel=16, _sudo=True)
+```
+
+Picking mirrors:
+```python
+# Moves apt to the fastest of these archive mirrors and lets apt-fast split
+# downloads across the fastest three
+apt_fast.mirrors(
+    name="Select fastest APT mirrors",
+    mirrors=["http://archive.ubuntu.com/ubuntu", "http://mirrors.kernel.org/ubuntu"],
+    count=3,
+    _sudo=True,
+)
+```
+
+Installed-package state:
+------------------------
+apt_fast keeps its own view of installed packages for the run instead of running
+DebPackages (a full dpkg listing) in every operation. It's loaded once, patched
+with what each operation installs or removes, and only reloaded when dpkg's
+status file changed behind apt_fast's back (a .deb install, a shell command).
+
+Unsafe I/O:
+-----------
+dpkg fsyncs every file it unpacks, which dominates install time on fresh machines.
+With ``unsafe_io=True`` (the default when ``settings.apt_unsafe_io`` is set, e.g.
+under DOCKER_TESTING=1) installs run with dpkg's ``--force-unsafe-io`` and under
+eatmydata when it's installed. Nothing is guaranteed to be on disk until the
+``sync`` barrier runs, so finish the deploy with one:
+
+```python
+apt_fast.sync(name="Flush unsafe dpkg writes to disk", _sudo=True)
+```
+
 Performance Recommendations:
 ---------------------------
-- Set parallel=16 for most systems (adjust based on available bandwidth)
+- Set parallel=16 for most systems (adjust based on available bandwidth). ``parallel``
+  is aria2's concurrent download count; ``split`` (connections per file) and
+  ``per_server`` (connections per mirror) can be tuned separately
+- See benchmarks/apt_fast_parallel.py to measure the effect against a local mirror
+- Use unsafe_io=True for throwaway machines and first boots (see
+  benchmarks/dpkg_unsafe_io.py for what it saves)
 - Use no_recommends=True where possible to reduce download size
 - Combine related package installations into larger batches
 - Consider the cache_time parameter to avoid redundant updates
@@ -95,21 +147,218 @@ apt.packages(
 Then you can use apt_fast for all subsequent operations.
 """
 
+import hashlib
+import inspect
+import shlex
 from datetime import timedelta
+from functools import wraps
+from urllib.parse import urlparse
 
-from pyinfra.context import host
+from pyinfra.api.command import FunctionCommand
 from pyinfra.api.operation import operation
+from pyinfra.context import host
 from pyinfra.facts.apt import SimulateOperationWillChange
-from pyinfra.facts.deb import DebPackages
+from pyinfra.facts.deb import DebPackage
 from pyinfra.facts.files import File
-from pyinfra.facts.server import Date
+from pyinfra.facts.server import Date, LsbRelease
 from pyinfra.operations.util.packaging import ensure_packages
 
+from config import CACHE_DIR, settings
+from facts import (
+    APT_STATE_FINGERPRINT_COMMAND,
+    AptFastConfig,
+    AptSourceUris,
+    AptStateFingerprint,
+    CachedDownloadModified,
+    DpkgPackageIndex,
+    MirrorProbe,
+)
+
 # Constant for the apt update timestamp file
 APT_UPDATE_FILENAME = "/var/lib/apt/periodic/update-success-stamp"
 
+# Apt state fingerprint (+ command) as of the last upgrade, see _simulate_then_perform
+APT_UPGRADE_FINGERPRINT_FILENAME = "/var/lib/apt/periodic/pyinfra-upgrade-fingerprint"
+
+# Changes whenever anything installs or removes a package through dpkg
+DPKG_STATUS_FILENAME = "/var/lib/dpkg/status"
+
+# apt-fast sources this file on every run; its aria2 settings are plain shell variables
+APT_FAST_CONF = "/etc/apt-fast.conf"
+
+# Held by a background prefetch until its downloads finish, see prefetch. Kept in
+# a root-only directory: the script runs as root and the lock is opened by it
+APT_PREFETCH_DIR = "/run/pyinfra"
+APT_PREFETCH_LOCK = f"{APT_PREFETCH_DIR}/apt-prefetch.lock"
+APT_PREFETCH_SCRIPT = f"{APT_PREFETCH_DIR}/apt-prefetch.sh"
+APT_PREFETCH_LOG = "/var/log/pyinfra-apt-prefetch.log"
+
+# Content-addressed cache of .debs downloaded by apt_fast.deb, see _cached_download_command
+DEB_CACHE_DIR = f"{CACHE_DIR}/debs"
+
+# Typical .deb size, used to weigh a mirror's latency against its throughput
+MIRROR_SCORE_SIZE = 1024 * 1024
+
+# apt_fast.mirrors moves apt off its current mirror only for one whose score is
+# below this fraction of the current one's, so probe noise doesn't flip it
+MIRROR_SWITCH_RATIO = 0.75
+
+# Touched whenever apt_fast.mirrors probes, see its probe_ttl
+MIRROR_PROBE_FILENAME = "/var/lib/apt/periodic/pyinfra-mirror-probe-stamp"
+
+# Sources files apt_fast.mirrors rewrites
+APT_SOURCES_FILES = (
+    "/etc/apt/sources.list /etc/apt/sources.list.d/*.list"
+    " /etc/apt/sources.list.d/*.sources"
+)
+
+# aria2c rejects more than 16 connections per server (-x/--max-connection-per-server)
+ARIA2_MAX_CONNECTIONS_PER_SERVER = 16
+
+# apt-fast.conf variable -> (environment override, apt-fast's own default)
+DOWNLOAD_SETTINGS = {
+    "_MAXNUM": ("APT_FAST_MAXNUM", "5"),
+    "_MAXCONPERSRV": ("APT_FAST_MAXCONPERSRV", "10"),
+    "_SPLITCON": ("APT_FAST_SPLITCON", "8"),
+}
+
+# Installed packages per (host, executing), loaded once and then patched by each
+# apt_fast operation instead of re-running dpkg-query (see _installed_packages)
+_package_index: dict[tuple[str, bool], dict] = {}
+
+# Installs deferred by packages(coalesce=True) until the next flush, per host:
+# (no_recommends, allow_downgrades, force, extra_install_args) -> package -> origins
+_pending_installs: dict[str, dict[tuple, dict[str, set[str]]]] = {}
+
+# Packages every packages() call in the deploy code asks for, per host and
+# no_recommends, recorded when the call is made (see _planned)
+_planned_installs: dict[str, dict[bool, set[str]]] = {}
+
+# Hosts whose deploy code starts a prefetch (see coalescing), and hosts with
+# one running in the background
+_prefetch_planned: set[str] = set()
+_prefetching: set[str] = set()
+
+# Hosts that ran dpkg without fsync and need a sync barrier (see sync)
+_unsynced: set[str] = set()
+
+# Mirror probes per host, so a run probes once rather than when preparing and
+# again when executing (see mirrors)
+_mirror_probes: dict[str, dict] = {}
 
-def noninteractive_apt_fast(command: str, force=False, parallel=8):
+
+def download_settings(parallel=8, split=None, per_server=None) -> dict[str, int]:
+    """
+    Map the parallel download arguments onto apt-fast's aria2 settings.
+
+    Args:
+        parallel: Maximum number of concurrent downloads (aria2 -j, ``_MAXNUM``)
+        split: Connections used to fetch a single file (aria2 -s, ``_SPLITCON``).
+               Defaults to min(parallel, 8).
+        per_server: Connections allowed to a single mirror (aria2 -x,
+                    ``_MAXCONPERSRV``). Defaults to parallel, capped at 16.
+    """
+    if split is None:
+        split = min(parallel, 8)
+    if per_server is None:
+        per_server = parallel
+
+    return {
+        "_MAXNUM": parallel,
+        "_MAXCONPERSRV": min(per_server, ARIA2_MAX_CONNECTIONS_PER_SERVER),
+        "_SPLITCON": split,
+    }
+
+
+def _ensure_download_settings():
+    """
+    Make apt-fast.conf read its aria2 settings from the environment.
+
+    apt-fast unconditionally sources /etc/apt-fast.conf, so the variables can't be
+    overridden per invocation as shipped. Rewriting them as ``${APT_FAST_X:-default}``
+    once lets every command pass its own values (see noninteractive_apt_fast) while
+    keeping apt-fast's defaults for manual runs.
+    """
+    config = host.get_fact(AptFastConfig)
+
+    # apt-fast isn't installed yet, it will fall back to its defaults
+    if not config:
+        return
+
+    for key, (env_var, default) in DOWNLOAD_SETTINGS.items():
+        value = f"${{{env_var}:-{default}}}"
+        if config.get(key) == value:
+            continue
+
+        yield (
+            f"grep -q '^{key}=' {APT_FAST_CONF}"
+            f" && sed -i 's/^{key}=.*/{key}={value}/' {APT_FAST_CONF}"
+            f" || echo '{key}={value}' >> {APT_FAST_CONF}"
+        )
+
+
+def score_mirrors(probes: dict[str, dict | None]) -> dict[str, float]:
+    """
+    Score probed mirrors (see facts.MirrorProbe) by the time they'd take to serve
+    a typical package: latency plus MIRROR_SCORE_SIZE at the measured throughput.
+    Failed probes are dropped.
+    """
+    return {
+        mirror: probe["latency"] + MIRROR_SCORE_SIZE / probe["throughput"]
+        for mirror, probe in probes.items()
+        if probe and probe["throughput"] > 0
+    }
+
+
+def rank_mirrors(probes: dict[str, dict | None]) -> list[str]:
+    """Order probed mirrors (see facts.MirrorProbe) from fastest to slowest."""
+    scores = score_mirrors(probes)
+    return sorted(scores, key=scores.__getitem__)
+
+
+def _wait_for_prefetch():
+    """Hold apt-fast commands back until a background prefetch has finished."""
+    if host.name in _prefetching:
+        yield f"flock {APT_PREFETCH_LOCK} true"
+
+
+def coalescing() -> bool:
+    """
+    Whether leaf installs should be deferred to the next apt_fast.flush (pass it
+    as packages' ``coalesce``): with APT_COALESCE=1, and after the deploy code
+    started a prefetch, so installs wait for its downloads at the next flush
+    rather than at the first apt_fast.packages, and whatever runs in between
+    (Homebrew, ...) overlaps with them.
+    """
+    return settings.apt_coalesce or host.name in _prefetch_planned
+
+
+def _before_apt_fast():
+    yield from _wait_for_prefetch()
+    yield from _ensure_download_settings()
+
+
+def _unsafe_io(unsafe_io=None) -> bool:
+    """
+    Resolve an operation's unsafe_io argument, and note that a sync is owed.
+
+    Only call this right before yielding the dpkg commands it applies to.
+    """
+    if unsafe_io is None:
+        unsafe_io = settings.apt_unsafe_io
+    if unsafe_io:
+        _unsynced.add(host.name)
+    return unsafe_io
+
+
+def noninteractive_apt_fast(
+    command: str,
+    force=False,
+    parallel=8,
+    split=None,
+    per_server=None,
+    unsafe_io=False,
+):
     """
     Generate a noninteractive apt-fast command string with parallel download support.
 
@@ -117,8 +366,20 @@ def noninteractive_apt_fast(command: str, force=False, parallel=8):
         command: The apt-fast command to run (e.g., 'install <packages>')
         force: Whether to add --force-yes to the command
         parallel: Number of parallel downloads (default: 8)
+        split: Connections per file (default: min(parallel, 8))
+        per_server: Connections per mirror (default: parallel, capped at 16)
+        unsafe_io: Run dpkg without fsync (--force-unsafe-io, and eatmydata if
+                   it's installed)
     """
-    args = ["DEBIAN_FRONTEND=noninteractive apt-fast -y"]
+    download = download_settings(parallel, split=split, per_server=per_server)
+    args = [f"{DOWNLOAD_SETTINGS[key][0]}={value}" for key, value in download.items()]
+    args.append("DEBIAN_FRONTEND=noninteractive")
+
+    if unsafe_io:
+        # Expands to nothing when eatmydata isn't installed
+        args.append("$(command -v eatmydata)")
+
+    args.append("apt-fast -y")
 
     if force:
         args.append("--force-yes")
@@ -127,41 +388,310 @@ def noninteractive_apt_fast(command: str, force=False, parallel=8):
         (
             '-o Dpkg::Options::="--force-confdef"',
             '-o Dpkg::Options::="--force-confold"',
-            f"-o Acquire::http::Dl-Limit={parallel}",  # Set number of parallel downloads
-            command,
         ),
     )
 
+    if unsafe_io:
+        args.append('-o Dpkg::Options::="--force-unsafe-io"')
+
+    args.append(command)
+
     return " ".join(args)
 
 
-def _simulate_then_perform(command: str, force=False, parallel=8):
+def _deb_cache_path(url: str) -> str:
+    """Where the .deb cache keeps the latest download of url (a link to its blob)."""
+    key = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return f"{DEB_CACHE_DIR}/urls/{key}.deb"
+
+
+def _etag_path(path: str) -> str:
+    """Where the ETag of the cached download at path is saved."""
+    return f"{path[: -len('.deb')]}.etag"
+
+
+def _cached_download_command(url: str, path: str) -> str:
+    """
+    Build the command refreshing the cached download of url at path.
+
+    Downloads are stored by content (``<sha256>.deb``) with path linking to the
+    current one. Requests carry the saved ETag (or, for servers without ETags,
+    the blob's Last-Modified time), so an unchanged file is answered with a
+    bodiless 304 and nothing is stored. Blobs no URL links to anymore are removed.
+    A partial download never outlives the command, so it can't be mistaken for
+    this one's body.
+    """
+    etag, part = _etag_path(path), f"{path[: -len('.deb')]}.part"
+    return (
+        f"mkdir -p {DEB_CACHE_DIR}/urls"
+        # A lost blob must not be revalidated against its old ETag
+        f" && {{ [ -e {path} ] || rm -f {etag}; }}"
+        f" && rm -f {part}"
+        f" && {{ curl -fsSL -R --etag-compare {etag} --etag-save {etag}.new"
+        # curl drops a 200 that isn't newer than -z, so only fall back to it
+        f" $([ -e {path} ] && [ ! -s {etag} ] && echo '-z {path}')"
+        f" -o {part} {shlex.quote(url)} || {{ rm -f {part} {etag}.new; false; }}; }}"
+        f" && {{ [ -s {etag}.new ] && mv {etag}.new {etag} || rm -f {etag}.new; }}"
+        f" && if [ -s {part} ]; then"
+        f" sha=$(sha256sum {part} | cut -d' ' -f1)"
+        f" && mv {part} {DEB_CACHE_DIR}/$sha.deb"
+        f" && ln -sfn ../$sha.deb {path}"
+        f" && for blob in {DEB_CACHE_DIR}/*.deb; do"
+        f' find {DEB_CACHE_DIR}/urls -lname "../${{blob##*/}}" | grep -q .'
+        ' || rm -f "$blob"; done;'
+        " fi"
+    )
+
+
+def _dpkg_status_stamp(target_host) -> tuple | None:
+    info = target_host.get_fact(File, path=DPKG_STATUS_FILENAME)
+    if not info:
+        return None
+    return info["mtime"], info["size"]
+
+
+def _installed_packages() -> dict[str, set[str]]:
+    """
+    Return this run's view of installed packages, querying dpkg on first use.
+
+    pyinfra runs operation code both while preparing and while executing, so each
+    phase keeps its own view. A cheap stat of dpkg's status file guards it: apt_fast
+    re-stamps the file after its own commands (see _restamp_packages), so a
+    mismatch means something else (a .deb, a shell command) changed dpkg state
+    and the full listing is loaded again.
+    """
+    key = (host.name, host.state.is_executing)
+    stamp = _dpkg_status_stamp(host)
+    index = _package_index.get(key)
+
+    if index is None or index["stamp"] != stamp:
+        index = {"packages": host.get_fact(DpkgPackageIndex), "stamp": stamp}
+        _package_index[key] = index
+
+    return index["packages"]
+
+
+def _record_packages(packages, present: bool) -> None:
+    """Patch the package view with what the current operation installs/removes."""
+    index = _package_index.get((host.name, host.state.is_executing))
+    if index is None:
+        return
+
+    if isinstance(packages, str):
+        packages = [packages]
+
+    for package in packages:
+        name, _, version = package.partition("=")
+        if not present:
+            index["packages"].pop(name, None)
+        elif version:
+            index["packages"][name] = {version}
+        else:
+            index["packages"].setdefault(name, set())
+
+
+def _forget_packages() -> None:
+    """Drop the package view when an operation changes more than it can patch in."""
+    _package_index.pop((host.name, host.state.is_executing), None)
+
+
+def _restamp_packages(state, host) -> None:
+    """Adopt dpkg's status file as changed by apt_fast's own (patched in) commands."""
+    index = _package_index.get((host.name, True))
+    if index is not None:
+        index["stamp"] = _dpkg_status_stamp(host)
+
+
+def _install_commands(
+    no_recommends=False, allow_downgrades=False, extra_install_args=None
+) -> tuple[str, str]:
+    """
+    Build the apt-fast install and upgrade subcommands for the given options.
+
+    Returns:
+        A tuple of (install_command, upgrade_command); extra_install_args only
+        applies to installs, matching pyinfra's apt.packages.
+    """
+    install_command_args = ["install"]
+    if no_recommends:
+        install_command_args.append("--no-install-recommends")
+    if allow_downgrades:
+        install_command_args.append("--allow-downgrades")
+
+    upgrade_command = " ".join(install_command_args)
+
+    if extra_install_args:
+        install_command_args.append(extra_install_args)
+
+    return " ".join(install_command_args), upgrade_command
+
+
+def _current_origin() -> str:
+    """
+    Name the deploy that queued the current operation, for flush reports.
+
+    Operation names are prefixed with the deploy stack ("Packages | Install Fonts |
+    Install fonts (APT)"), which is available both while preparing and executing.
+    Outside of an operation, there's no deploy to name.
+    """
+    if host.current_op_hash is None:
+        return "unknown"
+
+    names = host.state.get_op_meta(host.current_op_hash).names
+    parts = min(names).split(" | ")
+    return parts[-2] if len(parts) > 1 else parts[0]
+
+
+def _defer_install(packages, options: tuple) -> None:
+    """
+    Queue packages for the next flush on this host.
+
+    Operation generators run once while preparing (to detect changes) and again when
+    executing, so this must be idempotent: the queue is made of sets, and flush
+    empties it each time it runs.
+    """
+    if isinstance(packages, str):
+        packages = [packages]
+
+    pending = _pending_installs.setdefault(host.name, {}).setdefault(options, {})
+    origin = _current_origin()
+    for package in packages:
+        pending.setdefault(package, set()).add(origin)
+
+
+def _planned(op):
+    """
+    Record the packages each apt_fast.packages call asks for, as it's called.
+
+    prefetch runs before the operations that install these packages, and
+    operation bodies only run once pyinfra gets to them (not at all while
+    preparing with -y), so the plan is taken from the deploy code's calls.
+    """
+    signature = inspect.signature(op._inner)
+
+    @wraps(op)
+    def wrapper(*args, **kwargs):
+        # Leave out pyinfra's global arguments (name, _sudo, ...)
+        op_kwargs = {
+            key: value for key, value in kwargs.items() if key in signature.parameters
+        }
+        arguments = signature.bind_partial(*args, **op_kwargs).arguments
+        packages = arguments.get("packages")
+
+        if packages and arguments.get("present", True):
+            if isinstance(packages, str):
+                packages = [packages]
+            plan = _planned_installs.setdefault(host.name, {})
+            plan.setdefault(bool(arguments.get("no_recommends")), set()).update(
+                package.split("=", 1)[0] for package in packages
+            )
+
+        return op(*args, **kwargs)
+
+    return wrapper
+
+
+def _plans_prefetch(op):
+    """Record that the deploy code starts a prefetch on this host, see coalescing."""
+
+    @wraps(op)
+    def wrapper(*args, **kwargs):
+        _prefetch_planned.add(host.name)
+        return op(*args, **kwargs)
+
+    return wrapper
+
+
+def _simulate_then_perform(
+    command: str, force=False, parallel=8, split=None, per_server=None, unsafe_io=None
+):
     """
     Simulate an apt-fast command and only execute it if it would make changes.
 
+    The fingerprint of apt's lists and dpkg's status is recorded after every
+    upgrade (or simulation that found nothing to do). While it's unchanged nothing
+    new can be upgraded, so the simulation is skipped altogether.
+
     Args:
         command: The apt-fast command to simulate and possibly run
         force: Whether to add --force-yes to the command
         parallel: Number of parallel downloads
+        split: Connections per file
+        per_server: Connections per mirror
+        unsafe_io: Run dpkg without fsync (default: settings.apt_unsafe_io)
     """
+    fingerprint = host.get_fact(
+        AptStateFingerprint, path=APT_UPGRADE_FINGERPRINT_FILENAME
+    )
+    if fingerprint["current"] and (
+        fingerprint["recorded"] == f"{fingerprint['current']} {command}"
+    ):
+        host.noop(f"{command} skipped, apt state unchanged since the last run")
+        return
+
+    record_fingerprint = (
+        f'echo "$({APT_STATE_FINGERPRINT_COMMAND}) {command}"'
+        f" > {APT_UPGRADE_FINGERPRINT_FILENAME}"
+    )
+
     changes = host.get_fact(SimulateOperationWillChange, command)
 
-    if not changes:
-        # Simulation failed, so the actual operation will probably fail too
-        yield noninteractive_apt_fast(command, force=force, parallel=parallel)
-    elif (
+    if changes and (
         changes["upgraded"] == 0
         and changes["newly_installed"] == 0
         and changes["removed"] == 0
         and changes["not_upgraded"] == 0
     ):
         host.noop(f"{command} skipped, no changes would be performed")
-    else:
-        yield noninteractive_apt_fast(command, force=force, parallel=parallel)
+        yield record_fingerprint
+        return
+
+    # Either changes are pending, or the simulation failed and the actual
+    # operation will probably fail too (but should still surface the error)
+    _forget_packages()
+    yield from _before_apt_fast()
+    yield noninteractive_apt_fast(
+        command,
+        force=force,
+        parallel=parallel,
+        split=split,
+        per_server=per_server,
+        unsafe_io=_unsafe_io(unsafe_io),
+    )
+    yield record_fingerprint
+
+
+def _source_update_command(source: str, parallel=8):
+    """
+    Build the commands refreshing only one source's indexes.
+
+    Pointing Dir::Etc::sourcelist at a single file (and disabling sources.list.d)
+    makes apt fetch just that source's InRelease/Packages files. List-Cleanup is
+    off so the other sources' already-downloaded indexes are left alone.
+    """
+    options = (
+        "-o Dir::Etc::sourceparts=- -o APT::Get::List-Cleanup=0"
+        " -o Dir::Etc::sourcelist={0}"
+    )
+
+    # Already a sources file on the host
+    if source.startswith("/"):
+        yield noninteractive_apt_fast(
+            f"update {options.format(source)}", parallel=parallel
+        )
+        return
+
+    # A one-line repo spec (as passed to apt.repo), needs a file of its own
+    temp_filename = f"{host.get_temp_filename(source)}.list"
+    yield f"echo {shlex.quote(source)} > {temp_filename}"
+    yield noninteractive_apt_fast(
+        f"update {options.format(temp_filename)}", parallel=parallel
+    )
+    yield f"rm -f {temp_filename}"
 
 
 @operation()
-def update(cache_time=None, parallel=8):
+def update(cache_time=None, parallel=8, source=None):
     """
     Update apt repositories using apt-fast for faster downloads.
 
@@ -171,9 +701,13 @@ def update(cache_time=None, parallel=8):
     Args:
         cache_time: Cache updates for this many seconds. When set, this operation
                    will not run if the update was performed within the specified time.
-        parallel: Number of parallel downloads (default: 8). Higher values can
-                 improve performance but may saturate your network connection.
-                 Recommended values: 8-16 for most systems.
+        parallel: Number of parallel downloads (default: 8). apt-fast hands
+                 ``update`` straight to apt-get, so this only matters once the
+                 index download goes through aria2.
+        source: Only refresh this source: either a sources file on the host
+               (``/etc/apt/sources.list.d/docker.list``) or a repo line as given
+               to apt.repo. Ignores cache_time and leaves the update stamp as
+               is, since the other sources aren't refreshed.
 
     Example:
         ```python
@@ -183,8 +717,17 @@ def update(cache_time=None, parallel=8):
             parallel=16,
             _sudo=True,
         )
+
+        # Right after adding a repository, only fetch that repository's indexes
+        apt.repo(name="Add Docker repository", src=docker_repo, _sudo=True)
+        apt_fast.update(name="Update apt for Docker", source=docker_repo, _sudo=True)
         ```
     """
+    if source:
+        yield from _wait_for_prefetch()
+        yield from _source_update_command(source, parallel=parallel)
+        return
+
     # If cache_time check when apt was last updated
     if cache_time:
         cache_info = host.get_fact(File, path=APT_UPDATE_FILENAME)
@@ -196,6 +739,7 @@ def update(cache_time=None, parallel=8):
             host.noop("apt is already up to date")
             return
 
+    yield from _wait_for_prefetch()
     yield noninteractive_apt_fast("update", parallel=parallel)
 
     # Touch the update timestamp file to enable cache_time functionality
@@ -204,7 +748,7 @@ def update(cache_time=None, parallel=8):
 
 
 @operation()
-def upgrade(auto_remove=False, parallel=8):
+def upgrade(auto_remove=False, parallel=8, split=None, per_server=None, unsafe_io=None):
     """
     Upgrade all packages using apt-fast for faster downloads.
 
@@ -218,6 +762,12 @@ def upgrade(auto_remove=False, parallel=8):
         parallel: Number of parallel downloads (default: 8). Higher values can
                  improve performance but may saturate your network connection.
                  Recommended values: 8-16 for most systems.
+        split: Number of connections used to fetch a single package
+              (default: min(parallel, 8)).
+        per_server: Number of connections allowed to a single mirror
+                   (default: parallel, capped at aria2's limit of 16).
+        unsafe_io: Run dpkg without fsync (default: settings.apt_unsafe_io).
+                  Finish the deploy with apt_fast.sync when using it.
 
     Example:
         ```python
@@ -234,11 +784,25 @@ def upgrade(auto_remove=False, parallel=8):
     if auto_remove:
         command.append("--autoremove")
 
-    yield from _simulate_then_perform(" ".join(command), parallel=parallel)
+    yield from _simulate_then_perform(
+        " ".join(command),
+        parallel=parallel,
+        split=split,
+        per_server=per_server,
+        unsafe_io=unsafe_io,
+    )
 
 
 @operation()
-def deb(src: str, present=True, force=False, parallel=8):
+def deb(
+    src: str | list[str],
+    present=True,
+    force=False,
+    parallel=8,
+    split=None,
+    per_server=None,
+    unsafe_io=None,
+):
     """
     Add/remove .deb file packages using apt-fast for dependency installation.
 
@@ -246,15 +810,27 @@ def deb(src: str, present=True, force=False, parallel=8):
     using apt-fast for dependency installation, which can significantly speed up
     the installation process when a .deb package has many dependencies.
 
+    Several .debs can be given at once: the missing ones are unpacked in a
+    single dpkg run, followed by a single ``apt-fast install -f`` for all of
+    their dependencies.
+
+    URLs are downloaded into a cache under /var/cache/pyinfra/debs and
+    revalidated with their ETag/Last-Modified on later runs (see
+    facts.CachedDownloadModified), so an unchanged package costs one
+    conditional request instead of a full download, and changes nothing.
+
     Args:
-        src: Filename or URL of the .deb file. If a URL is provided, it will be
-             downloaded automatically.
+        src: Filename or URL of the .deb file, or a list of them. URLs are
+             downloaded (and cached) automatically.
         present: Whether the package should exist on the system. When False, the
                 package will be removed.
         force: Whether to force the package install by passing --force-yes to apt.
                This can help resolve some installation issues.
         parallel: Number of parallel downloads for dependency installation (default: 8).
                  Higher values can speed up dependency installation.
+        split: Number of connections used to fetch a single package.
+        per_server: Number of connections allowed to a single mirror.
+        unsafe_io: Run dpkg without fsync (default: settings.apt_unsafe_io).
 
     Example:
         ```python
@@ -267,20 +843,79 @@ def deb(src: str, present=True, force=False, parallel=8):
         ```
 
     Note:
-        This operation uses the regular apt.deb operation to install the .deb file
-        and then uses apt-fast to resolve and install dependencies, combining the
-        benefits of both tools.
+        dpkg installs the .deb files themselves and apt-fast resolves and
+        installs their dependencies, combining the benefits of both tools.
     """
-    # First use the regular apt.deb operation to install the package
-    from pyinfra.operations import apt
+    sources = [src] if isinstance(src, str) else list(src)
+    paths = []
+
+    for source in sources:
+        if urlparse(source).scheme:
+            path = _deb_cache_path(source)
+            if host.get_fact(
+                CachedDownloadModified, url=source, path=path, etag=_etag_path(path)
+            ):
+                yield _cached_download_command(source, path)
+            paths.append(path)
+        else:
+            paths.append(source)
+
+    # Read after the downloads above have run
+    installed = _installed_packages()
+    to_install: dict[str, str] = {}
+    to_remove: list[str] = []
 
-    yield from apt.deb._inner(src=src, present=present, force=force)
+    for source, path in zip(sources, paths):
+        info = host.get_fact(DebPackage, package=path)
+        exists = bool(info) and info.get("version") in installed.get(info["name"], ())
 
-    # If we're installing the package, use apt-fast to install any dependencies
-    if present:
-        yield noninteractive_apt_fast("install -f", force=force, parallel=parallel)
+        if present and not exists:
+            to_install[path] = info["name"] if info else path
+        elif not present and exists:
+            to_remove.append(info["name"])
+        else:
+            host.noop(f"deb {source} is {'' if present else 'not '}installed")
+
+    download_args = {"parallel": parallel, "split": split, "per_server": per_server}
+
+    if to_remove:
+        _record_packages(to_remove, False)
+        yield from _before_apt_fast()
+        yield noninteractive_apt_fast(
+            f"remove {' '.join(to_remove)}", force=force, **download_args
+        )
+        yield FunctionCommand(_restamp_packages, (), {})
+
+    if not to_install:
+        return
+
+    unsafe_io = _unsafe_io(unsafe_io)
+    dpkg = "dpkg --force-unsafe-io" if unsafe_io else "dpkg"
+    debs = " ".join(shlex.quote(path) for path in to_install)
+    names = " ".join(shlex.quote(name) for name in to_install.values())
+
+    # apt-fast install -f pulls in dependencies too, reload the view afterwards
+    _forget_packages()
+    yield from _before_apt_fast()
+    # Unpack everything in one go, ignoring failure (on unmet dependencies)...
+    yield f"{dpkg} --force-confdef --force-confold -i {debs} 2> /dev/null || true"
+    # ...install every missing dependency at once (this configures the debs too)...
+    yield noninteractive_apt_fast(
+        "install -f",
+        force=force,
+        unsafe_io=unsafe_io,
+        **download_args,
+    )
+    # ...and fail if any of them still isn't installed
+    yield (
+        f"{dpkg} --configure --pending && "
+        f"[ \"$(dpkg-query -W -f='${{db:Status-Abbrev}}\\n' {names} 2>/dev/null"
+        f" | grep -c '^ii')\" -eq {len(to_install)} ]"
+        f" || {{ echo 'Failed to install {names}' >&2; exit 1; }}"
+    )
 
 
+@_planned
 @operation()
 def packages(
     packages=None,
@@ -295,6 +930,10 @@ def packages(
     extra_install_args=None,
     extra_uninstall_args=None,
     parallel=8,
+    split=None,
+    per_server=None,
+    coalesce=False,
+    unsafe_io=None,
 ):
     """
     Install/remove/update packages using apt-fast for parallel downloads.
@@ -318,6 +957,17 @@ def packages(
         extra_uninstall_args: Additional arguments to the apt uninstall command.
         parallel: Number of parallel downloads (default: 8). Higher values (16-32)
                  can significantly improve performance for large package installations.
+        split: Number of connections used to fetch a single package
+              (default: min(parallel, 8)).
+        per_server: Number of connections allowed to a single mirror
+                   (default: parallel, capped at aria2's limit of 16).
+        coalesce: Defer installing to the next apt_fast.flush operation, which
+                 installs everything deferred since the previous flush in a single
+                 apt transaction. Removals, updates, upgrades and latest=True still
+                 run immediately. Only use this when a flush follows and nothing in
+                 between depends on these packages.
+        unsafe_io: Run dpkg without fsync (default: settings.apt_unsafe_io).
+                  Deferred installs use the flush's setting instead.
 
     Versions:
         Package versions can be pinned like apt: ``<pkg>=<version>``
@@ -353,29 +1003,35 @@ def packages(
                 and cache_info["mtime"]
                 and cache_info["mtime"] > host_cache_time
             ):
+                yield from _wait_for_prefetch()
                 yield noninteractive_apt_fast("update", parallel=parallel)
                 yield f"touch {APT_UPDATE_FILENAME}"
         else:
+            yield from _wait_for_prefetch()
             yield noninteractive_apt_fast("update", parallel=parallel)
 
     # Upgrade if needed
     if upgrade:
         command = ["upgrade"]
-        yield from _simulate_then_perform(" ".join(command), parallel=parallel)
-
-    # Build the install command
-    install_command_args = ["install"]
-    if no_recommends:
-        install_command_args.append("--no-install-recommends")
-    if allow_downgrades:
-        install_command_args.append("--allow-downgrades")
-
-    upgrade_command = " ".join(install_command_args)
+        yield from _simulate_then_perform(
+            " ".join(command),
+            parallel=parallel,
+            split=split,
+            per_server=per_server,
+            unsafe_io=unsafe_io,
+        )
 
-    if extra_install_args:
-        install_command_args.append(extra_install_args)
+    if coalesce and present and not latest:
+        _defer_install(
+            packages, (no_recommends, allow_downgrades, force, extra_install_args)
+        )
+        host.noop("install deferred to apt_fast.flush")
+        return
 
-    install_command = " ".join(install_command_args)
+    # Build the install command
+    install_command, upgrade_command = _install_commands(
+        no_recommends, allow_downgrades, extra_install_args
+    )
 
     # Build the uninstall command
     uninstall_command_args = ["remove"]
@@ -384,21 +1040,340 @@ def packages(
 
     uninstall_command = " ".join(uninstall_command_args)
 
+    download_args = {"parallel": parallel, "split": split, "per_server": per_server}
+    # Resolved now, the install commands are built before knowing whether they run
+    unsafe_io = settings.apt_unsafe_io if unsafe_io is None else unsafe_io
+
     # Compare/ensure packages are present/not
-    yield from ensure_packages(
-        host,
-        packages,
-        host.get_fact(DebPackages),
-        present,
-        install_command=noninteractive_apt_fast(
-            install_command, force=force, parallel=parallel
-        ),
-        uninstall_command=noninteractive_apt_fast(
-            uninstall_command, force=force, parallel=parallel
-        ),
-        upgrade_command=noninteractive_apt_fast(
-            upgrade_command, force=force, parallel=parallel
-        ),
-        version_join="=",
-        latest=latest,
+    commands = list(
+        ensure_packages(
+            host,
+            packages,
+            _installed_packages(),
+            present,
+            install_command=noninteractive_apt_fast(
+                install_command, force=force, unsafe_io=unsafe_io, **download_args
+            ),
+            uninstall_command=noninteractive_apt_fast(
+                uninstall_command, force=force, unsafe_io=unsafe_io, **download_args
+            ),
+            upgrade_command=noninteractive_apt_fast(
+                upgrade_command, force=force, unsafe_io=unsafe_io, **download_args
+            ),
+            version_join="=",
+            latest=latest,
+        )
     )
+
+    if commands:
+        _record_packages(packages, present)
+        _unsafe_io(unsafe_io)
+        yield from _before_apt_fast()
+        yield from commands
+        yield FunctionCommand(_restamp_packages, (), {})
+
+
+@operation()
+def flush(parallel=8, split=None, per_server=None, unsafe_io=None):
+    """
+    Install every package deferred by packages(coalesce=True) in one transaction.
+
+    Each deferred packages call would otherwise pay for its own dependency
+    resolution, dpkg run and trigger processing. Flushing resolves and unpacks the
+    whole set at once; calls with different install options (no_recommends,
+    allow_downgrades, force, extra_install_args) still get one transaction per
+    option set (a package requested under several goes in with the first). The
+    deploys that asked for each package are logged on execution.
+
+    Args:
+        parallel: Number of parallel downloads (default: 8).
+        split: Number of connections used to fetch a single package.
+        per_server: Number of connections allowed to a single mirror.
+        unsafe_io: Run dpkg without fsync (default: settings.apt_unsafe_io).
+
+    Example:
+        ```python
+        apt_fast.packages(
+            name="Install fonts (APT)",
+            packages=["fonts-inter", "fonts-roboto"],
+            coalesce=True,
+            _sudo=True,
+        )
+        ...
+        apt_fast.flush(name="Install deferred APT packages", parallel=16, _sudo=True)
+        ```
+    """
+    pending = _pending_installs.pop(host.name, {})
+    if not pending:
+        host.noop("no deferred apt packages")
+        return
+
+    current_packages = _installed_packages()
+    commands = []
+    seen: set[str] = set()
+    unsafe_io = settings.apt_unsafe_io if unsafe_io is None else unsafe_io
+
+    for options, requested in pending.items():
+        no_recommends, allow_downgrades, force, extra_install_args = options
+        # A package asked for with different options goes in with the first set
+        requested = {
+            package: origins
+            for package, origins in requested.items()
+            if package not in seen
+        }
+        seen.update(requested)
+        if not requested:
+            continue
+
+        install_command, _ = _install_commands(
+            no_recommends, allow_downgrades, extra_install_args
+        )
+
+        if host.state.is_executing:
+            for package, origins in sorted(requested.items()):
+                if package.rsplit("=", 1)[0] not in current_packages:
+                    host.log(f"{package} requested by {', '.join(sorted(origins))}")
+
+        commands.extend(
+            ensure_packages(
+                host,
+                sorted(requested),
+                current_packages,
+                True,
+                install_command=noninteractive_apt_fast(
+                    install_command,
+                    force=force,
+                    parallel=parallel,
+                    split=split,
+                    per_server=per_server,
+                    unsafe_io=unsafe_io,
+                ),
+                uninstall_command="",
+                version_join="=",
+            )
+        )
+
+    if commands:
+        _record_packages(seen, True)
+        _unsafe_io(unsafe_io)
+        yield from _before_apt_fast()
+        yield from commands
+        yield FunctionCommand(_restamp_packages, (), {})
+
+
+@_plans_prefetch
+@operation()
+def prefetch(parallel=8, split=None, per_server=None):
+    """
+    Download every package this deploy will install, in the background.
+
+    Collects the packages of every apt_fast.packages call made by the deploy code
+    (including ones after this operation), drops those already installed, and
+    starts ``apt-fast install --download-only`` for the rest without waiting for
+    it. Later installs then only unpack from the archive cache, and the downloads
+    overlap with whatever runs in between (Homebrew, ...). Every apt_fast command
+    after this one waits for the downloads to finish first, so leaf installs
+    should be deferred to a flush (see coalescing), and apt or dpkg commands that
+    don't go through apt_fast should come after wait_for_prefetch.
+
+    Packages from repositories that aren't configured yet (added later in the
+    deploy) are skipped and simply downloaded by their own install.
+
+    Args:
+        parallel: Number of parallel downloads (default: 8).
+        split: Number of connections used to fetch a single package.
+        per_server: Number of connections allowed to a single mirror.
+
+    Example:
+        ```python
+        apt_fast.prefetch(name="Prefetch APT packages", parallel=16, _sudo=True)
+        ```
+    """
+    installed = _installed_packages()
+    script = []
+
+    for no_recommends, planned in sorted(_planned_installs.get(host.name, {}).items()):
+        missing = sorted(package for package in planned if package not in installed)
+        if not missing:
+            continue
+
+        install_command, _ = _install_commands(no_recommends=no_recommends)
+        quoted = " ".join(shlex.quote(package) for package in missing)
+        # Only ask for what apt knows about, or the whole transaction fails
+        script.append(
+            f"pkgs=$(apt-cache --no-all-versions show {quoted} 2>/dev/null"
+            " | sed -n 's/^Package: //p' | sort -u)"
+        )
+        script.append(
+            '[ -z "$pkgs" ] || '
+            + noninteractive_apt_fast(
+                f"{install_command} --download-only $pkgs",
+                parallel=parallel,
+                split=split,
+                per_server=per_server,
+            )
+        )
+
+    if not script:
+        host.noop("no packages to prefetch")
+        return
+
+    before = list(_before_apt_fast())
+    _prefetching.add(host.name)
+
+    yield from before
+    yield (
+        f"mkdir -p -m 0700 {APT_PREFETCH_DIR}"
+        f" && echo {shlex.quote(chr(10).join(script))} > {APT_PREFETCH_SCRIPT}"
+    )
+    # The background job inherits the lock (fd 9) and holds it until it's done
+    yield (
+        f"exec 9>{APT_PREFETCH_LOCK} && flock 9"
+        f" && (nohup sh {APT_PREFETCH_SCRIPT} > {APT_PREFETCH_LOG} 2>&1 < /dev/null &)"
+    )
+
+
+@operation()
+def wait_for_prefetch():
+    """
+    Wait for a background prefetch to finish.
+
+    apt_fast operations already do, this is for apt and dpkg commands that don't
+    go through apt_fast: the download holds apt's archive lock while it runs.
+
+    Example:
+        ```python
+        apt_fast.wait_for_prefetch(name="Wait for APT downloads", _sudo=True)
+        server.shell(name="Install package", commands=["dpkg -i pkg.deb"], _sudo=True)
+        ```
+    """
+    if host.name not in _prefetching:
+        host.noop("no APT prefetch running")
+        return
+
+    yield from _wait_for_prefetch()
+
+
+@operation()
+def sync():
+    """
+    Flush everything dpkg wrote without fsync (unsafe_io) to disk.
+
+    A single ``sync`` at the end of the deploy costs a fraction of the per-file
+    fsyncs it replaces. Does nothing when no apt_fast operation used unsafe_io on
+    this host.
+
+    Example:
+        ```python
+        apt_fast.sync(name="Flush unsafe dpkg writes to disk", _sudo=True)
+        ```
+    """
+    if host.name not in _unsynced:
+        host.noop("no unsafe dpkg writes to flush")
+        return
+
+    yield "sync"
+
+
+@operation()
+def mirrors(mirrors: list[str], count=3, parallel=8, probe_ttl=7 * 24 * 60 * 60):
+    """
+    Point apt at the fastest archive mirror and hand the fastest few to apt-fast.
+
+    Probes every candidate for latency and throughput (see facts.MirrorProbe),
+    at most once per ``probe_ttl``. The candidate currently in apt's sources is
+    only replaced by a clearly faster one (see MIRROR_SWITCH_RATIO), and
+    apt-fast's MIRRORS list is set to the fastest ``count`` mirrors, current one
+    first, so aria2 splits downloads across all of them.
+
+    When the sources change, indexes are refreshed right away, like
+    ``apt_fast.update(cache_time=...)`` does it: its stamp is touched, so a
+    following cached update doesn't refresh them again. Put this after the
+    deploy's repositories are added, so that refresh covers them too.
+
+    Args:
+        mirrors: Candidate mirrors of the same archive, as they'd appear in apt's
+                sources (``http://archive.ubuntu.com/ubuntu``)
+        count: How many of the fastest mirrors apt-fast downloads from (default: 3)
+        parallel: Number of parallel downloads for the index refresh (default: 8)
+        probe_ttl: Seconds a probe is good for (default: a week), 0 to always probe
+
+    Example:
+        ```python
+        apt_fast.mirrors(
+            name="Select fastest APT mirrors",
+            mirrors=[
+                "http://archive.ubuntu.com/ubuntu",
+                "http://mirrors.kernel.org/ubuntu",
+                "http://mirror.math.princeton.edu/pub/ubuntu",
+            ],
+            count=3,
+            _sudo=True,
+        )
+        ```
+    """
+    candidates = [mirror.rstrip("/") for mirror in mirrors]
+    sources = host.get_fact(AptSourceUris)
+    current = next((mirror for mirror in candidates if mirror in sources), None)
+
+    # apt-fast only adds alternatives for URIs it finds in the sources
+    if current is None:
+        host.noop("none of the candidate mirrors is in apt's sources")
+        return
+
+    if host.name not in _mirror_probes:
+        if probe_ttl:
+            stamp = host.get_fact(File, path=MIRROR_PROBE_FILENAME)
+            probed_after = host.get_fact(Date).replace(tzinfo=None) - timedelta(
+                seconds=probe_ttl
+            )
+            if stamp and stamp["mtime"] and stamp["mtime"] > probed_after:
+                host.noop("mirrors were probed recently")
+                return
+
+        codename = host.get_fact(LsbRelease)["codename"]
+        _mirror_probes[host.name] = host.get_fact(
+            MirrorProbe,
+            mirrors=tuple(candidates),
+            path=f"dists/{codename}/InRelease",
+        )
+
+    scores = score_mirrors(_mirror_probes[host.name])
+    ranked = sorted(scores, key=scores.__getitem__)
+    if not ranked:
+        host.noop("no candidate mirror answered, keeping the current one")
+        return
+
+    # Don't churn the sources for a mirror that's only faster within the noise
+    primary = current
+    if current not in scores or scores[ranked[0]] < (
+        scores[current] * MIRROR_SWITCH_RATIO
+    ):
+        primary = ranked[0]
+    fastest = [primary] + [mirror for mirror in ranked if mirror != primary]
+    fastest = fastest[:count]
+
+    yield f"touch {MIRROR_PROBE_FILENAME}"
+
+    if primary != current:
+        # Whole URIs only (.../ubuntu must not match .../ubuntu-ports)
+        pattern = current.replace(".", r"\.") + r"/*\([[:space:]]\|$\)"
+        yield (
+            f"for f in {APT_SOURCES_FILES}; do"
+            f' [ -f "$f" ] && sed -i \'s#{pattern}#{primary}/\\1#g\' "$f";'
+            " done; true"
+        )
+        yield from _wait_for_prefetch()
+        yield noninteractive_apt_fast("update", parallel=parallel)
+        yield f"touch {APT_UPDATE_FILENAME}"
+
+    config = host.get_fact(AptFastConfig)
+    value = f"( '{','.join(fastest)}' )"
+    # The same mirrors in another order are as good (the primary comes first)
+    configured = (config or {}).get("MIRRORS", "").strip("( )'").split(",")
+    if config and (configured[:1] != fastest[:1] or set(configured) != set(fastest)):
+        yield (
+            f"grep -q '^MIRRORS=' {APT_FAST_CONF}"
+            f' && sed -i "s#^MIRRORS=.*#MIRRORS={value}#" {APT_FAST_CONF}'
+            f' || echo "MIRRORS={value}" >> {APT_FAST_CONF}'
+        )
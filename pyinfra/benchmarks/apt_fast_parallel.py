@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+apt_fast_parallel.py
+
+Benchmark how apt-fast's download time scales with the ``parallel`` argument.
+
+A local HTTP server stands in for an apt mirror: it serves synthetic .deb files
+and throttles every connection to a fixed rate, like a real mirror does. aria2c is
+then run with exactly the options apt-fast would use (taken from
+apt_fast.download_settings) for each ``parallel`` value.
+
+Usage:
+    uv run python benchmarks/apt_fast_parallel.py --parallel 1 --parallel 4 --parallel 16
+
+Requires aria2c on the PATH (it's what apt-fast drives).
+"""
+
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from apt_fast import download_settings
+
+app = typer.Typer(help="Benchmark apt-fast parallel downloads against a local mirror")
+console = Console()
+
+CHUNK_SIZE = 16 * 1024
+
+
+def make_mirror_handler(files: dict[str, int], rate: int, latency: float):
+    """Build a request handler serving `files` (path -> size) at `rate` bytes/s."""
+
+    class MirrorHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _range(self, size: int) -> tuple[int, int] | None:
+            match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+            if not match:
+                return None
+            start = int(match[1]) if match[1] else 0
+            end = int(match[2]) if match[2] else size - 1
+            return start, min(end, size - 1)
+
+        def _headers(self) -> tuple[int, int] | None:
+            size = files.get(self.path)
+            if size is None:
+                self.send_error(404)
+                return None
+
+            time.sleep(latency)
+            byte_range = self._range(size)
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Type", "application/vnd.debian.binary-package")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            return start, end
+
+        def do_HEAD(self):
+            self._headers()
+
+        def do_GET(self):
+            byte_range = self._headers()
+            if byte_range is None:
+                return
+
+            remaining = byte_range[1] - byte_range[0] + 1
+            chunk = b"\0" * CHUNK_SIZE
+            while remaining > 0:
+                sent = min(remaining, CHUNK_SIZE)
+                self.wfile.write(chunk[:sent])
+                remaining -= sent
+                # Per-connection throttle, the thing parallel downloads work around
+                time.sleep(sent / rate)
+
+    return MirrorHandler
+
+
+def aria2c_command(settings: dict[str, int], input_file: Path, dest: Path) -> list[str]:
+    """The aria2c invocation from apt-fast's default _DOWNLOADER."""
+    return [
+        "aria2c",
+        "--no-conf",
+        "-c",
+        f"-j{settings['_MAXNUM']}",
+        f"-x{settings['_MAXCONPERSRV']}",
+        f"-s{settings['_SPLITCON']}",
+        "--min-split-size=1M",
+        "--stream-piece-selector=default",
+        f"-i{input_file}",
+        "--connect-timeout=600",
+        "--timeout=600",
+        "-m0",
+        f"--dir={dest}",
+        "--console-log-level=warn",
+        "--summary-interval=0",
+    ]
+
+
+@app.command()
+def main(
+    parallel: list[int] = typer.Option(
+        [1, 2, 4, 8, 16], "--parallel", "-p", help="parallel values to compare"
+    ),
+    packages: int = typer.Option(32, help="Number of synthetic packages"),
+    size_kb: int = typer.Option(2048, help="Size of each package in KiB"),
+    rate_kb: int = typer.Option(1024, help="Per-connection mirror rate in KiB/s"),
+    latency_ms: int = typer.Option(50, help="Mirror response latency in ms"),
+):
+    """Time an apt-fast style download of the same package set per parallel value."""
+    if not shutil.which("aria2c"):
+        console.print(
+            "[bold red]aria2c not found.[/] Install aria2 to run this benchmark."
+        )
+        raise typer.Exit(1)
+
+    files = {
+        f"/pool/main/pkg{i}_1.0_amd64.deb": size_kb * 1024 for i in range(packages)
+    }
+    handler = make_mirror_handler(files, rate_kb * 1024, latency_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mirror = f"http://127.0.0.1:{server.server_address[1]}"
+
+    table = Table(title=f"{packages} x {size_kb} KiB at {rate_kb} KiB/s per connection")
+    table.add_column("parallel", justify="right")
+    table.add_column("-j/-x/-s", justify="right")
+    table.add_column("seconds", justify="right")
+    table.add_column("speedup", justify="right")
+
+    baseline = None
+    try:
+        for value in parallel:
+            settings = download_settings(value)
+            with tempfile.TemporaryDirectory() as tmp:
+                input_file = Path(tmp) / "download.list"
+                input_file.write_text("".join(f"{mirror}{path}\n" for path in files))
+
+                start = time.perf_counter()
+                subprocess.run(
+                    aria2c_command(settings, input_file, Path(tmp)), check=True
+                )
+                elapsed = time.perf_counter() - start
+
+            baseline = baseline or elapsed
+            table.add_row(
+                str(value),
+                f"{settings['_MAXNUM']}/{settings['_MAXCONPERSRV']}/{settings['_SPLITCON']}",
+                f"{elapsed:.2f}",
+                f"{baseline / elapsed:.1f}x",
+            )
+    finally:
+        server.shutdown()
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+dpkg_unsafe_io.py
+
+Benchmark a fresh install with and without apt_fast's unsafe_io mode.
+
+Synthetic .deb packages (many small files each, like most of a desktop install)
+are built with dpkg-deb and installed into a throwaway dpkg root, once per mode:
+
+- ``default``: dpkg fsyncs every file it unpacks
+- ``force-unsafe-io``: dpkg's own switch, skips those fsyncs
+- ``eatmydata``: force-unsafe-io under eatmydata, which also drops the fsyncs of
+  dpkg's database updates (only if eatmydata is installed)
+
+Each mode ends with the single ``sync`` apt_fast.sync runs, and its time counts.
+
+Usage:
+    uv run python benchmarks/dpkg_unsafe_io.py --packages 200 --dir /var/tmp
+
+Use a --dir on a real disk: fsync is free on tmpfs, so /tmp often shows nothing.
+"""
+
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer(help="Benchmark dpkg installs with and without fsync")
+console = Console()
+
+
+def build_packages(dest: Path, packages: int, files: int, size_kb: int) -> list[Path]:
+    """Build `packages` .debs with `files` files of `size_kb` KiB each."""
+    debs = []
+    payload = b"\0" * (size_kb * 1024)
+
+    for i in range(packages):
+        name = f"pyinfra-bench-{i}"
+        tree = dest / "build" / name
+        (tree / "DEBIAN").mkdir(parents=True)
+        (tree / "DEBIAN" / "control").write_text(
+            f"Package: {name}\n"
+            "Version: 1.0\n"
+            "Architecture: all\n"
+            "Maintainer: bench <bench@localhost>\n"
+            "Description: synthetic package for dpkg_unsafe_io.py\n"
+        )
+        share = tree / "usr" / "share" / name
+        share.mkdir(parents=True)
+        for j in range(files):
+            (share / f"file{j}").write_bytes(payload)
+
+        deb = dest / f"{name}_1.0_all.deb"
+        subprocess.run(
+            ["dpkg-deb", "--build", "-Zgzip", "-z1", str(tree), str(deb)],
+            check=True,
+            capture_output=True,
+        )
+        debs.append(deb)
+
+    shutil.rmtree(dest / "build")
+    return debs
+
+
+def make_root(path: Path) -> None:
+    """An empty dpkg root: just the database dpkg --root expects."""
+    admin = path / "var" / "lib" / "dpkg"
+    for directory in ("updates", "info", "triggers"):
+        (admin / directory).mkdir(parents=True)
+    (admin / "status").touch()
+    (admin / "available").touch()
+
+
+def install(root: Path, debs: list[Path], mode: str) -> float:
+    """Install `debs` into `root` the way `mode` would, then sync; return seconds."""
+    command = [
+        "dpkg",
+        f"--root={root}",
+        "--force-not-root",
+        "--force-script-chrootless",
+        "--force-bad-path",
+        "--log=/dev/null",
+    ]
+    if mode != "default":
+        command.append("--force-unsafe-io")
+    if mode == "eatmydata":
+        command.insert(0, "eatmydata")
+    command += ["-i", *map(str, debs)]
+
+    start = time.perf_counter()
+    subprocess.run(command, check=True, capture_output=True)
+    subprocess.run(["sync"], check=True)
+    return time.perf_counter() - start
+
+
+@app.command()
+def main(
+    packages: int = typer.Option(100, help="Number of synthetic packages"),
+    files: int = typer.Option(50, help="Files per package"),
+    size_kb: int = typer.Option(16, help="Size of each file in KiB"),
+    runs: int = typer.Option(3, help="Runs per mode (the best one counts)"),
+    dir: Path = typer.Option(
+        Path("/var/tmp"), help="Where to build and install (use a real disk)"
+    ),
+):
+    """Time a fresh dpkg install of the same package set per fsync mode."""
+    if not shutil.which("dpkg-deb"):
+        console.print(
+            "[bold red]dpkg not found.[/] This benchmark needs a Debian host."
+        )
+        raise typer.Exit(1)
+
+    modes = ["default", "force-unsafe-io"]
+    if shutil.which("eatmydata"):
+        modes.append("eatmydata")
+    else:
+        console.print("[yellow]eatmydata not installed, skipping that mode[/]")
+
+    table = Table(
+        title=f"{packages} packages x {files} files x {size_kb} KiB (best of {runs})"
+    )
+    table.add_column("mode")
+    table.add_column("seconds", justify="right")
+    table.add_column("speedup", justify="right")
+
+    with tempfile.TemporaryDirectory(dir=dir) as tmp:
+        with console.status("Building packages..."):
+            debs = build_packages(Path(tmp), packages, files, size_kb)
+
+        baseline = None
+        for mode in modes:
+            timings = []
+            for run in range(runs):
+                root = Path(tmp) / f"root-{mode}-{run}"
+                make_root(root)
+                timings.append(install(root, debs, mode))
+                shutil.rmtree(root)
+
+            elapsed = min(timings)
+            baseline = baseline or elapsed
+            table.add_row(mode, f"{elapsed:.2f}", f"{baseline / elapsed:.1f}x")
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
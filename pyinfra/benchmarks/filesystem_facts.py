@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+filesystem_facts.py
+
+Benchmark UvInstallation and FlatpakRemotes, which read uv tool receipts and
+flatpak's repo/config directly, against the commands they used to run.
+
+A synthetic tree is generated: ``--tools`` uv tools laid out like ``uv tool
+install`` leaves them (receipt, pyvenv.cfg, dist-info with METADATA) and a flatpak
+installation whose repo/config has ``--remotes`` remotes. Each fact's command is
+run against it (through UV_TOOL_DIR and FLATPAK_SYSTEM_DIR) and its output parsed;
+the parse is also timed on its own. Where uv or flatpak are installed, the old
+``uv tool list`` and ``flatpak remotes`` commands are timed on the same tree.
+
+Usage:
+    uv run python benchmarks/filesystem_facts.py --tools 500 --remotes 50
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from facts import FlatpakRemotes, UvInstallation
+
+app = typer.Typer(help="Benchmark the filesystem-based uv and flatpak facts")
+console = Console()
+
+
+def make_uv_tools(path: Path, tools: int) -> None:
+    """`tools` uv tools, each with two entrypoints and a few dependencies."""
+    python_version = sysconfig.get_python_version()
+    for i in range(tools):
+        name = f"tool-{i}"
+        tool = path / name
+        site_packages = tool / "lib" / f"python{python_version}" / "site-packages"
+        (tool / "bin").mkdir(parents=True)
+        (tool / "bin" / "python").symlink_to(sys.executable)
+        (tool / "pyvenv.cfg").write_text(
+            f"home = {Path(sys.executable).parent}\n"
+            "implementation = CPython\n"
+            f"version_info = {sys.version.split()[0]}\n"
+            "include-system-site-packages = false\n"
+        )
+        (tool / "uv-receipt.toml").write_text(
+            "[tool]\n"
+            f'requirements = [{{ name = "{name}" }}]\n'
+            "entrypoints = [\n"
+            f'    {{ name = "{name}", install-path = "/usr/local/bin/{name}" }},\n'
+            f'    {{ name = "{name}d", install-path = "/usr/local/bin/{name}d" }},\n'
+            "]\n"
+        )
+        for dist, version in [
+            (name, f"1.{i}.0"),
+            ("click", "8.1.8"),
+            ("rich", "13.9.4"),
+        ]:
+            info = site_packages / f"{dist.replace('-', '_')}-{version}.dist-info"
+            info.mkdir(parents=True)
+            (info / "METADATA").write_text(
+                f"Metadata-Version: 2.1\nName: {dist}\nVersion: {version}\n"
+            )
+
+
+def make_flatpak_repo(path: Path, remotes: int) -> None:
+    """A flatpak installation whose repo/config has `remotes` remotes."""
+    lines = ["[core]", "repo_version=1", "mode=bare-user-only", ""]
+    for i in range(remotes):
+        lines += [
+            f'[remote "remote-{i}"]',
+            f"url=https://example.org/repo-{i}/",
+            f"xa.title=Remote {i}",
+            "gpg-verify=true",
+            "gpg-verify-summary=true",
+            "",
+        ]
+    (path / "repo").mkdir(parents=True)
+    (path / "repo" / "config").write_text("\n".join(lines))
+
+
+def best_of(runs: int, func) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def shell(command: str, env: dict[str, str]) -> list[str]:
+    return subprocess.run(
+        ["sh", "-c", command], capture_output=True, text=True, env=env
+    ).stdout.splitlines()
+
+
+@app.command()
+def main(
+    tools: int = typer.Option(300, help="Number of synthetic uv tools"),
+    remotes: int = typer.Option(30, help="Number of synthetic flatpak remotes"),
+    runs: int = typer.Option(5, help="Runs per variant (the best one counts)"),
+):
+    """Time the uv and flatpak facts on a synthetic tree, old commands included."""
+    table = Table(title=f"{tools} uv tools, {remotes} flatpak remotes (best of {runs})")
+    table.add_column("fact")
+    table.add_column("variant")
+    table.add_column("found", justify="right")
+    table.add_column("seconds", justify="right")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with console.status("Generating the tree..."):
+            make_uv_tools(Path(tmp) / "uv", tools)
+            make_flatpak_repo(Path(tmp) / "flatpak", remotes)
+
+        env = {
+            **os.environ,
+            "UV_TOOL_DIR": f"{tmp}/uv",
+            "FLATPAK_SYSTEM_DIR": f"{tmp}/flatpak",
+            "FLATPAK_USER_DIR": f"{tmp}/flatpak-user",
+        }
+
+        for fact, old_command in [
+            (UvInstallation(), "uv --version && uv tool list 2>/dev/null || true"),
+            (FlatpakRemotes(), "flatpak remotes --show-details 2>/dev/null || true"),
+        ]:
+            name = type(fact).__name__
+            output = shell(fact.command(), env)
+            value = fact.process(output)
+            found = len(value["tools"] if name == "UvInstallation" else value)
+
+            read = best_of(runs, lambda: fact.process(shell(fact.command(), env)))
+            parse = best_of(runs, lambda: fact.process(output))
+            table.add_row(name, "read files + parse", str(found), f"{read:.4f}")
+            table.add_row(name, "parse only", str(found), f"{parse:.4f}")
+
+            program = old_command.split()[0]
+            if shutil.which(program):
+                old_found = sum(
+                    1 for line in shell(old_command, env) if line and line[0] != "-"
+                )
+                # uv --version's own line isn't a tool
+                old_found -= name == "UvInstallation"
+                old = best_of(runs, lambda: shell(old_command, env))
+                table.add_row(name, f"{program} (before)", str(old_found), f"{old:.4f}")
+            else:
+                console.print(
+                    f"[yellow]{program} not found, skipping its old command[/]"
+                )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
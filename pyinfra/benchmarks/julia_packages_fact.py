@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+julia_packages_fact.py
+
+Benchmark the JuliaPackages fact: starting Julia to list the environment versus
+reading Project.toml and Manifest.toml and parsing them with tomllib.
+
+By default a synthetic depot is generated with ``--packages`` dependencies in a
+v<version> environment (format 2.0 manifest, like current Julia writes). Pass
+``--depot`` to time a real depot instead (e.g. ~/.julia); the Julia side then
+lists that same depot, so both sides describe the same environment.
+
+Usage:
+    uv run python benchmarks/julia_packages_fact.py --packages 200
+    uv run python benchmarks/julia_packages_fact.py --depot ~/.julia
+
+The "before" row needs julia on the PATH and is skipped otherwise.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from facts import JuliaPackages
+
+app = typer.Typer(help="Benchmark the JuliaPackages fact with and without Julia")
+console = Console()
+
+# The fact's command before it read the TOML files itself
+JULIA_COMMAND = (
+    "julia -e 'using Pkg; println(join(keys(Pkg.project().dependencies), \",\"))'"
+    " 2>/dev/null || true"
+)
+
+
+def make_depot(path: Path, packages: int, version: str) -> None:
+    """A depot whose default environment has `packages` dependencies."""
+    env = path / "environments" / f"v{version}"
+    env.mkdir(parents=True)
+
+    project = ["[deps]"]
+    manifest = [
+        f'julia_version = "{version}.0"',
+        'manifest_format = "2.0"',
+        'project_hash = "0000000000000000000000000000000000000000"',
+    ]
+    for i in range(packages):
+        name, package_uuid = f"Package{i}", uuid.uuid4()
+        project.append(f'{name} = "{package_uuid}"')
+        manifest += [
+            "",
+            f"[[deps.{name}]]",
+            'deps = ["LinearAlgebra", "Random"]',
+            'git-tree-sha1 = "0000000000000000000000000000000000000000"',
+            f'uuid = "{package_uuid}"',
+            f'version = "1.{i}.0"',
+        ]
+
+    (env / "Project.toml").write_text("\n".join(project) + "\n")
+    (env / f"Manifest-v{version}.toml").write_text("\n".join(manifest) + "\n")
+
+
+def run_fact(command: str, depot: Path, runs: int, process) -> tuple[float, int]:
+    """Best time of `runs` runs of command + process, and the packages found."""
+    env = {**os.environ, "JULIA_DEPOT_PATH": str(depot)}
+    timings, found = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            ["sh", "-c", command], capture_output=True, text=True, env=env
+        ).stdout
+        found = len(process(output.splitlines()))
+        timings.append(time.perf_counter() - start)
+    return min(timings), found
+
+
+@app.command()
+def main(
+    packages: int = typer.Option(100, help="Dependencies in the synthetic environment"),
+    version: str = typer.Option("1.11", help="Julia version of the environment"),
+    depot: Path | None = typer.Option(None, help="Use this depot instead"),
+    runs: int = typer.Option(5, help="Runs per variant (the best one counts)"),
+):
+    """Time the JuliaPackages fact before and after reading the TOML files."""
+    fact = JuliaPackages()
+
+    def process_names(lines):
+        return [name for line in lines for name in line.split(",") if name.strip()]
+
+    table = Table(title=f"JuliaPackages (best of {runs})")
+    table.add_column("variant")
+    table.add_column("packages", justify="right")
+    table.add_column("seconds", justify="right")
+    table.add_column("speedup", justify="right")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if depot is None:
+            depot = Path(tmp)
+            make_depot(depot, packages, version)
+
+        after, found = run_fact(fact.command(), depot, runs, fact.process)
+
+        if shutil.which("julia"):
+            before, before_found = run_fact(JULIA_COMMAND, depot, runs, process_names)
+            table.add_row(
+                "julia -e (before)", str(before_found), f"{before:.3f}", "1.0x"
+            )
+            table.add_row(
+                "Project/Manifest.toml",
+                str(found),
+                f"{after:.3f}",
+                f"{before / after:.0f}x",
+            )
+        else:
+            console.print("[yellow]julia not found, skipping the before row[/]")
+            table.add_row("Project/Manifest.toml", str(found), f"{after:.3f}", "-")
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
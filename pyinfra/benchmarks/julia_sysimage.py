@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+julia_sysimage.py
+
+Check what julia.sysimage buys: time-to-first-plot with Julia's default
+sysimage versus the one it built.
+
+``using Plots; plot(1:10)`` is run in a fresh Julia process with the channel's
+own sysimage (``julia +release``) and with the built one (``--sysimage``), and
+the wall time of each process is compared.
+
+Usage:
+    uv run python benchmarks/julia_sysimage.py
+    uv run python benchmarks/julia_sysimage.py --sysimage ~/.julia/sysimages/workstation.so
+
+Needs juliaup's julia launcher, Plots in the default environment and a sysimage
+built by julia.sysimage (JULIA_SYSIMAGE=1).
+"""
+
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer(help="Time Julia's time-to-first-plot with and without the sysimage")
+console = Console()
+
+WORKLOAD = "using Plots; plot(1:10)"
+SYSIMAGE_EXT = "dylib" if platform.system() == "Darwin" else "so"
+
+
+def time_julia(julia: list[str], runs: int) -> float:
+    """Best wall time of `runs` fresh Julia processes running WORKLOAD."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [*julia, "--startup-file=no", "-e", WORKLOAD],
+            check=True,
+            capture_output=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@app.command()
+def main(
+    julia: Path = typer.Option(
+        Path.home() / ".juliaup" / "bin" / "julia", help="juliaup's julia launcher"
+    ),
+    sysimage: Path = typer.Option(
+        Path.home() / ".julia" / "sysimages" / f"workstation.{SYSIMAGE_EXT}",
+        help="Sysimage built by julia.sysimage",
+    ),
+    channel: str = typer.Option("release", help="juliaup channel it was built with"),
+    runs: int = typer.Option(3, help="Runs per variant (the best one counts)"),
+):
+    """Time `using Plots; plot(1:10)` before and after the sysimage."""
+    if not julia.exists() or not sysimage.exists():
+        console.print(
+            f"[bold red]Need {julia} and {sysimage}.[/]"
+            " Install Julia and build the sysimage (JULIA_SYSIMAGE=1) first."
+        )
+        raise typer.Exit(1)
+
+    table = Table(title=f"{WORKLOAD} (best of {runs})")
+    table.add_column("sysimage")
+    table.add_column("seconds", justify="right")
+    table.add_column("speedup", justify="right")
+
+    with console.status("Timing the default sysimage..."):
+        before = time_julia([str(julia), f"+{channel}"], runs)
+    with console.status("Timing the built sysimage..."):
+        after = time_julia([str(julia), f"+{channel}", f"--sysimage={sysimage}"], runs)
+
+    table.add_row(f"default ({channel})", f"{before:.2f}", "1.0x")
+    table.add_row(str(sysimage), f"{after:.2f}", f"{before / after:.1f}x")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
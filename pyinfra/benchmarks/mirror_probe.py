@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+mirror_probe.py
+
+Check apt_fast.mirrors' mirror ranking against local stand-ins with known speeds.
+
+Each stand-in is a local HTTP server serving dists/<codename>/InRelease with an
+injected response delay and a per-connection rate limit. The MirrorProbe fact's
+command is run against all of them, and the ranking apt_fast.mirrors would act on
+is compared with the one the injected delays and rates imply.
+
+Usage:
+    uv run python benchmarks/mirror_probe.py
+    uv run python benchmarks/mirror_probe.py --mirror 20:4096 --mirror 300:8192
+
+Each --mirror is ``<latency ms>:<rate KiB/s>``; ``down`` adds an unreachable one.
+Exits non-zero if the probed ranking doesn't match the expected one.
+"""
+
+import subprocess
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from apt_fast_parallel import make_mirror_handler
+
+from apt_fast import MIRROR_SCORE_SIZE, rank_mirrors
+from facts import MirrorProbe
+
+app = typer.Typer(help="Check mirror probing against local stand-ins")
+console = Console()
+
+CODENAME = "noble"
+
+
+@app.command()
+def main(
+    mirror: list[str] = typer.Option(
+        ["50:2048", "10:512", "200:8192", "5:4096", "down"],
+        "--mirror",
+        "-m",
+        help="Stand-in as <latency ms>:<rate KiB/s>, or 'down'",
+    ),
+    size_kb: int = typer.Option(256, help="Size of the InRelease file in KiB"),
+    count: int = typer.Option(3, help="Mirrors apt_fast.mirrors would hand apt-fast"),
+):
+    """Probe local stand-in mirrors and compare the ranking with the expected one."""
+    files = {f"/ubuntu/dists/{CODENAME}/InRelease": size_kb * 1024}
+    servers = []
+    expected_scores = {}
+
+    for spec in mirror:
+        if spec == "down":
+            # Nothing listens on port 1
+            expected_scores["http://127.0.0.1:1/ubuntu"] = None
+            continue
+
+        latency_ms, rate_kb = (int(value) for value in spec.split(":"))
+        handler = make_mirror_handler(files, rate_kb * 1024, latency_ms / 1000)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        url = f"http://127.0.0.1:{server.server_address[1]}/ubuntu"
+        expected_scores[url] = latency_ms / 1000 + MIRROR_SCORE_SIZE / (rate_kb * 1024)
+
+    try:
+        fact = MirrorProbe()
+        command = fact.command(
+            mirrors=tuple(expected_scores), path=f"dists/{CODENAME}/InRelease"
+        )
+        output = subprocess.run(
+            ["sh", "-c", command], capture_output=True, text=True, check=True
+        ).stdout
+        probes = fact.process(output.splitlines())
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    ranked = rank_mirrors(probes)
+    expected = sorted(
+        (url for url, score in expected_scores.items() if score is not None),
+        key=expected_scores.__getitem__,
+    )
+
+    table = Table(title="Probed mirrors, fastest first")
+    table.add_column("mirror")
+    table.add_column("latency (ms)", justify="right")
+    table.add_column("KiB/s", justify="right")
+    table.add_column("expected rank", justify="right")
+
+    for url in ranked + [url for url in probes if url not in ranked]:
+        probe = probes[url]
+        table.add_row(
+            url,
+            f"{probe['latency'] * 1000:.0f}" if probe else "failed",
+            f"{probe['throughput'] / 1024:.0f}" if probe else "-",
+            str(expected.index(url) + 1) if url in expected else "-",
+        )
+
+    console.print(table)
+    console.print(f"apt-fast MIRRORS: {', '.join(ranked[:count])}")
+
+    if ranked != expected:
+        console.print("[bold red]Ranking doesn't match the injected speeds[/]")
+        raise typer.Exit(1)
+
+    console.print("[bold green]Ranking matches the injected speeds[/]")
+
+
+if __name__ == "__main__":
+    app()
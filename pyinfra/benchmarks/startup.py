@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+startup.py
+
+Benchmark the import time a pyinfra run pays for this repo, with ``python -X
+importtime``.
+
+pyinfra's own CLI (pyinfra_cli.main) is imported first in every run and left
+out of the numbers, since any run pays for it. On top of it, each target
+resolves deploys through the deploys registry the way main.py does:
+
+- ``full``: every deploy plus what main.py's full run imports (facts, apt_fast,
+  settings), i.e. what every run imported before the registry was lazy
+- one row per ``--deploy``: just that deploy, like ``DEPLOYS=<name>`` or
+  ``docker_test.py run <name>``
+
+Usage:
+    uv run python benchmarks/startup.py
+    uv run python benchmarks/startup.py --deploy setup_fish --deploy install_julia
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+REPO = Path(__file__).resolve().parent.parent
+
+app = typer.Typer(help="Benchmark import time per deploy")
+console = Console()
+
+BASELINE = "import pyinfra_cli.main"
+
+FULL = (
+    "import deploys\n"
+    "for name in deploys.DEPLOYS: deploys.resolve(name)\n"
+    "import apt_fast, facts, pyinfra.facts.server\n"
+    "from config import settings"
+)
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """
+    Cumulative import time (µs) of each module first imported by `statement`,
+    after the baseline, keyed by top-level module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{BASELINE}\n{statement}"],
+        capture_output=True,
+        text=True,
+        cwd=REPO,
+        check=True,
+    )
+
+    times: dict[str, int] = {}
+    after_baseline = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == "pyinfra_cli.main" and name.startswith(" pyinfra"):
+            after_baseline = True
+            continue
+        # Only top-level entries: nested ones are already in their parent's time
+        if (
+            after_baseline
+            and not name.startswith("  ")
+            and cumulative.strip().isdigit()
+        ):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def best_of(runs: int, statement: str) -> dict[str, int]:
+    """The run with the lowest total, as import_times reports it."""
+    return min(
+        (import_times(statement) for _ in range(runs)),
+        key=lambda times: sum(times.values()),
+    )
+
+
+@app.command()
+def main(
+    deploy: list[str] = typer.Option(
+        ["setup_fish", "configure_wallpaper", "install_julia"],
+        "--deploy",
+        "-d",
+        help="Deploys to time on their own",
+    ),
+    runs: int = typer.Option(5, help="Runs per target (the best one counts)"),
+):
+    """Time the imports of a full run and of single-deploy runs."""
+    targets = {"full": FULL}
+    for name in deploy:
+        targets[name] = f"import deploys\ndeploys.resolve({name!r})"
+
+    table = Table(title=f"Import time on top of pyinfra's CLI (best of {runs})")
+    table.add_column("target")
+    table.add_column("ms", justify="right")
+    table.add_column("of full", justify="right")
+    table.add_column("heaviest imports")
+
+    full = None
+    for target, statement in targets.items():
+        times = best_of(runs, statement)
+        total = sum(times.values()) / 1000
+        full = full or total
+        heaviest = sorted(times.items(), key=lambda item: -item[1])[:3]
+        table.add_row(
+            target,
+            f"{total:.1f}",
+            f"{total / full:.0%}",
+            ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest),
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
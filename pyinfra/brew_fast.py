@@ -0,0 +1,253 @@
+"""
+brew_fast.py - Homebrew formula installs sized to the open file limit.
+
+``brew install`` with many formulae can run out of file descriptors, which is
+why formulae used to be installed five at a time. Instead, brew_fast.packages:
+
+1. raises the soft RLIMIT_NOFILE to what the host allows for its brew runs
+   (never lowering it),
+2. sizes its batches from that limit (usually one batch for everything),
+3. fetches the bottles of every missing formula and dependency concurrently,
+4. then pours them with one ``brew install`` per batch, from the cache.
+
+Every brew operation should also run in the same session: with BREW_ENV as
+``_env``, brew neither auto-updates nor cleans up on each call. Instead
+brew_fast.update updates once per run (at most every settings.brew_update_ttl
+seconds) and brew_fast.cleanup cleans up once at the end.
+
+Downloads go to BREW_CACHE_DIR (HOMEBREW_CACHE), a cache under
+/var/cache/pyinfra that outlives the run and can be shared with test
+containers (``docker_test.py run --brew-cache``), so provisioning the same
+formulae again pours them from local bottles. brew_fast.cleanup keeps it under
+settings.brew_cache_max_mb by evicting the least recently used bottles.
+
+Usage:
+------
+```python
+import brew_fast
+
+brew_fast.update(name="Update Homebrew", _env=brew_fast.BREW_ENV)
+
+brew_fast.packages(
+    name="Install dev tools (Brew)",
+    packages=["git", "ripgrep", "fzf"],
+    _env=brew_fast.BREW_ENV,
+)
+
+brew_fast.cleanup(name="Clean up Homebrew", _env=brew_fast.BREW_ENV)
+```
+"""
+
+import shlex
+
+from pyinfra.api.operation import operation
+from pyinfra.context import host
+from pyinfra.facts.brew import BrewPackages
+from pyinfra.operations import brew
+
+from config import BREW_PATH, CACHE_DIR, settings
+from facts import BrewLastUpdate, OpenFileLimit
+
+# Bottles and API data, kept across runs (setup_brew creates it for the user)
+BREW_CACHE_DIR = f"{CACHE_DIR}/brew"
+
+# Environment for every brew call of a run: brew on the PATH, no auto-update or
+# cleanup per call (see update and cleanup), the JSON API data kept for as long
+# as the one `brew update` is, and downloads in the managed cache
+BREW_ENV = {
+    "PATH": f"{BREW_PATH}:$PATH",
+    "HOMEBREW_NO_AUTO_UPDATE": "1",
+    "HOMEBREW_NO_INSTALL_CLEANUP": "1",
+    "HOMEBREW_API_AUTO_UPDATE_SECS": str(max(settings.brew_update_ttl, 1)),
+    "HOMEBREW_NO_ENV_HINTS": "1",
+    "HOMEBREW_CACHE": BREW_CACHE_DIR,
+}
+
+# Open file limit brew runs are raised to when the host allows it
+BREW_NOFILE_TARGET = 65536
+# Descriptors one formula can hold open during `brew install` (bottle, tar,
+# Ruby sources, linking), and what brew itself keeps open regardless
+BREW_FDS_PER_FORMULA = 32
+BREW_FD_RESERVE = 256
+
+
+def nofile_limit(limits: dict[str, int | None]) -> int:
+    """The open file limit brew runs get, given an OpenFileLimit fact."""
+    soft, hard = limits["soft"], limits["hard"]
+    if soft is None:
+        return BREW_NOFILE_TARGET
+    return max(soft, min(hard or BREW_NOFILE_TARGET, BREW_NOFILE_TARGET))
+
+
+def batch_size(nofile: int) -> int:
+    """How many formulae one `brew install` can take within `nofile` descriptors."""
+    return max(1, (nofile - BREW_FD_RESERVE) // BREW_FDS_PER_FORMULA)
+
+
+# Hosts where brew_fast installed or upgraded something this run, for cleanup
+_installed: set[str] = set()
+
+
+def _raise_nofile(nofile: int) -> str:
+    """Shell raising the soft open file limit to `nofile`, never lowering it."""
+    return (
+        f'{{ [ "$(ulimit -Sn)" = unlimited ] || [ "$(ulimit -Sn)" -ge {nofile} ]'
+        f" || ulimit -Sn {nofile}; }}"
+    )
+
+
+def _formula_name(package: str) -> str:
+    # Tapped formulae (oven-sh/bun/bun) are listed by their short name
+    return package.rsplit("/", 1)[-1]
+
+
+@operation()
+def packages(packages: list[str], fetch_jobs=8, batch=None):
+    """
+    Install missing brew formulae, fetching their bottles concurrently first.
+
+    Args:
+        packages: Formulae to ensure are installed (tapped ones as user/tap/name).
+        fetch_jobs: Concurrent ``brew fetch`` processes.
+        batch: Formulae per ``brew install`` (default: sized from the open file
+              limit, see batch_size).
+
+    Example:
+        ```python
+        brew_fast.packages(
+            name="Install shell tools (Brew)",
+            packages=["lsd", "bat", "zoxide"],
+            fetch_jobs=16,
+            _env=brew_fast.BREW_ENV,
+        )
+        ```
+    """
+    installed = host.get_fact(BrewPackages)
+    missing = [
+        package for package in packages if _formula_name(package) not in installed
+    ]
+
+    if not missing:
+        host.noop("all brew formulae are installed")
+        return
+
+    _installed.add(host.name)
+    nofile = nofile_limit(host.get_fact(OpenFileLimit))
+    batch = batch or batch_size(nofile)
+    ulimit = _raise_nofile(nofile)
+    formulae = " ".join(shlex.quote(package) for package in missing)
+
+    # Download everything up front, several bottles at a time. brew deps
+    # --missing adds the dependencies that aren't installed yet; a failed fetch
+    # is just downloaded again by brew install.
+    yield (
+        f"{ulimit} && {{ printf '%s\\n' {formulae};"
+        f" brew deps --union --missing {formulae} 2>/dev/null; }}"
+        f" | sort -u | xargs -P {fetch_jobs} -n 1 brew fetch --formula --quiet"
+        " || true"
+    )
+
+    # Pouring takes brew's lock, so batches run one after the other
+    for start in range(0, len(missing), batch):
+        chunk = " ".join(
+            shlex.quote(package) for package in missing[start : start + batch]
+        )
+        yield f"{ulimit} && brew install --formula {chunk}"
+
+
+@operation()
+def casks(casks: list[str], upgrade=False):
+    """
+    Install missing brew casks, like ``brew.casks``, and have brew_fast.cleanup
+    clean up after them.
+
+    Args:
+        casks: Casks to ensure are installed.
+        upgrade: Upgrade the installed casks first.
+
+    Example:
+        ```python
+        brew_fast.casks(
+            name="Install Ghostty (Brew cask)",
+            casks=["ghostty"],
+            _env=brew_fast.BREW_ENV,
+        )
+        ```
+    """
+    commands = list(brew.casks._inner(casks=casks, upgrade=upgrade))
+    if commands:
+        _installed.add(host.name)
+    yield from commands
+
+
+@operation()
+def update(ttl=None):
+    """
+    Run ``brew update`` unless the last one is more recent than ``ttl``.
+
+    Args:
+        ttl: Seconds an update is good for (default: settings.brew_update_ttl).
+
+    Example:
+        ```python
+        brew_fast.update(name="Update Homebrew", _env=brew_fast.BREW_ENV)
+        ```
+    """
+    ttl = settings.brew_update_ttl if ttl is None else ttl
+    age = host.get_fact(BrewLastUpdate)
+
+    if age is not None and age < ttl:
+        host.noop(f"Homebrew was updated {age // 60} minutes ago")
+        return
+
+    yield "brew update"
+
+
+def evict_command(cache_dir: str, max_mb: int) -> str:
+    """
+    Shell command deleting the least recently used downloads of a brew cache
+    until the rest fit in `max_mb`, along with the links brew keeps to them.
+    """
+    # Downloads are named by URL hash in downloads/, and pouring a bottle reads
+    # it, so access time orders them by use. ls -u -t sorts by it on GNU and
+    # BSD alike, most recent first: whatever no longer fits after that goes.
+    downloads = shlex.quote(f"{cache_dir}/downloads")
+    return (
+        f"cd {downloads} 2>/dev/null || exit 0; used=0;"
+        " ls -u -t | while IFS= read -r file; do"
+        ' used=$((used + $(du -k "$file" | cut -f1)));'
+        f' [ "$used" -le {max_mb * 1024} ] || rm -rf "$file";'
+        " done;"
+        # With -L, only links whose download is gone are still of type l
+        f" find -L {shlex.quote(cache_dir)} -maxdepth 2 -type l -exec rm -f {{}} +"
+    )
+
+
+@operation()
+def cleanup(max_cache_mb=None):
+    """
+    Run ``brew cleanup`` once, after the whole run instead of after every install,
+    then evict the least recently used downloads beyond the cache size cap.
+
+    brew cleanup only drops downloads of outdated versions, so bottles of
+    formulae other hosts and containers install stay cached for them.
+    Does nothing when brew_fast.packages and brew_fast.casks installed nothing
+    on this host.
+
+    Args:
+        max_cache_mb: Size cap of BREW_CACHE_DIR in MiB
+                      (default: settings.brew_cache_max_mb).
+
+    Example:
+        ```python
+        brew_fast.cleanup(name="Clean up Homebrew", _env=brew_fast.BREW_ENV)
+        ```
+    """
+    if host.name not in _installed:
+        host.noop("nothing installed with brew to clean up after")
+        return
+
+    yield "brew cleanup"
+
+    max_cache_mb = settings.brew_cache_max_mb if max_cache_mb is None else max_cache_mb
+    yield evict_command(BREW_CACHE_DIR, max_cache_mb)
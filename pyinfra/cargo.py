@@ -0,0 +1,122 @@
+"""
+cargo.py - PyInfra operations for cargo-installed tools.
+
+``cargo install --force`` rebuilds a crate from source every time it runs.
+cargo.tools instead diffs the wanted crates against what cargo recorded as
+installed (see facts.CargoCrates) and only installs the ones that are missing
+or at another version, preferring the prebuilt binaries cargo-binstall finds
+for them over compiling. A run with nothing to change starts no cargo at all.
+
+What does get compiled goes through sccache, with its local disk cache in
+SCCACHE_DIR under /var/cache/pyinfra, so rebuilding a crate (a version bump,
+a fresh container with the cache mounted) reuses the dependencies it already
+compiled. The cache hit rate is printed after each install.
+
+Usage:
+------
+```python
+import cargo
+
+cargo.tools(
+    name="Install Cargo tools",
+    crates={"cargo-edit": None, "cargo-update": "16.3.0"},
+    sccache_dir=cargo.SCCACHE_DIR,
+    _env={"PATH": f"{HOME}/.cargo/bin:$PATH"},
+)
+```
+"""
+
+import shlex
+
+from pyinfra.api.operation import operation
+from pyinfra.context import host
+
+from config import CACHE_DIR
+from facts import CargoCrates
+
+# sccache's local disk cache (install_rust creates it for the user)
+SCCACHE_DIR = f"{CACHE_DIR}/sccache"
+
+# What sccache --show-stats reports that matters here, hit rate included
+SCCACHE_STATS = "^(Compile requests|Cache hits|Cache misses|Cache size|Max cache size)"
+
+# cargo-binstall's installer: downloads its prebuilt release for the host and
+# has it install itself, so it's recorded like any other crate
+BINSTALL_INSTALLER = (
+    "https://raw.githubusercontent.com/cargo-bins/cargo-binstall/main"
+    "/install-from-binstall-release.sh"
+)
+
+
+@operation()
+def tools(
+    crates: dict[str, str | None],
+    binstall=True,
+    jobs=None,
+    sccache_dir=None,
+    sccache_size="10G",
+):
+    """
+    Install crates' binaries, skipping the ones installed at the wanted version.
+
+    Args:
+        crates: Crate name -> exact version to have, or None for any version
+                (so an installed crate is left alone; cargo install-update
+                handles upgrades).
+        binstall: Install with ``cargo binstall``, which fetches prebuilt
+                  binaries when the crate publishes them and compiles
+                  otherwise. cargo-binstall itself is installed from its
+                  prebuilt release first if it's missing.
+        jobs: Parallel rustc jobs per build (CARGO_BUILD_JOBS, default: cargo's,
+              every core).
+        sccache_dir: Compile through sccache (RUSTC_WRAPPER) with its cache in
+                     this directory, installing sccache first if it's missing.
+        sccache_size: Size limit of the sccache cache (SCCACHE_CACHE_SIZE).
+
+    Example:
+        ```python
+        cargo.tools(
+            name="Install Cargo tools",
+            crates={"cargo-edit": None, "cargo-update": None},
+            _env={"PATH": f"{HOME}/.cargo/bin:$PATH"},
+        )
+        ```
+    """
+    installed = host.get_fact(CargoCrates)
+
+    missing = []
+    for crate, version in crates.items():
+        if crate in installed and version in (None, installed[crate]["version"]):
+            continue
+        missing.append(f"{crate}@{version}" if version else crate)
+
+    if not missing:
+        host.noop("all cargo tools are installed")
+        return
+
+    install = "cargo install --locked"
+    if binstall:
+        if "cargo-binstall" not in installed:
+            yield f"curl -L --proto '=https' --tlsv1.2 -sSf {BINSTALL_INSTALLER} | bash"
+        install = "cargo binstall --no-confirm --locked"
+
+    specs = " ".join(shlex.quote(spec) for spec in missing)
+    if jobs:
+        install = f"CARGO_BUILD_JOBS={jobs} {install}"
+    if not sccache_dir:
+        yield f"{install} {specs}"
+        return
+
+    # sccache itself is built (or fetched) without it
+    if "sccache" not in installed:
+        yield f"{install} sccache"
+
+    # Stats are zeroed first, so they're this install's
+    yield (
+        "export RUSTC_WRAPPER=sccache"
+        f" SCCACHE_DIR={shlex.quote(sccache_dir)}"
+        f" SCCACHE_CACHE_SIZE={shlex.quote(sccache_size)}"
+        f" && sccache --zero-stats >/dev/null && {install} {specs};"
+        f" status=$?; sccache --show-stats | grep -E {shlex.quote(SCCACHE_STATS)};"
+        " sccache --stop-server >/dev/null 2>&1; exit $status"
+    )
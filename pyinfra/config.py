@@ -1,9 +1,10 @@
 import os
 import platform
 import subprocess
+from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
-
-from pydantic_settings import BaseSettings
+from typing import Any
 
 USER: str = "agucova"
 HOME: Path = (
@@ -15,114 +16,85 @@ BREW_PATH: Path = (
     else Path("/opt/homebrew/bin")  # Since Apple Silicon
 )
 FILES_DIR: Path = Path(__file__).parent / "files"
+# Download and build caches kept across runs (see apt_fast.deb)
+CACHE_DIR: Path = Path("/var/cache/pyinfra")
 
 
-class Settings(BaseSettings):
-    mathematica_license_key: str | None = None
-    docker_testing: bool = os.environ.get("DOCKER_TESTING", "0") == "1"
+def __getattr__(name: str) -> Any:
+    # Settings (pydantic_settings) is most of config's import time, so it's only
+    # loaded once something reads config.settings
+    if name == "settings":
+        from settings import settings
 
+        globals()["settings"] = settings
+        return settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def is_macos() -> bool:
+
+@dataclass
+class HostProfile:
     """
-    Check if the current system is macOS.
+    What the deploys branch on, worked out once per host (see host_profile).
 
-    Uses PyInfra's Kernel fact to determine the OS when possible,
-    with fallback to platform.system() when called outside a deploy context.
+    Inside a deploy context it comes from the Kernel, OsRelease and HasGui facts;
+    outside one (e.g. importing config from a script) from the local machine.
     """
-    try:
-        from pyinfra.context import ctx_host
-        from pyinfra.facts.server import Kernel
-
-        # Check if we're in a deploy context
-        host = ctx_host.get()
-        if host is not None:
-            return host.get_fact(Kernel) == "Darwin"
-    except (ImportError, AttributeError):
-        pass
 
-    # Fallback to platform.system() if PyInfra isn't available or initialized
-    return platform.system() == "Darwin"
+    kernel: str
+    distro: str
+    nixos: bool
+    docker_testing: bool
+    # Local GUI probe still running, read by `gui` the first time it's needed
+    _display_probe: subprocess.Popen | None = field(default=None, repr=False)
+    _gui: bool | None = field(default=None, repr=False)
+
+    @property
+    def linux(self) -> bool:
+        return self.kernel == "Linux"
+
+    @property
+    def macos(self) -> bool:
+        return self.kernel == "Darwin"
+
+    @cached_property
+    def gui(self) -> bool:
+        if self.docker_testing:
+            return False
+        if self._gui is not None:
+            return self._gui
+        if self._display_probe is not None:
+            try:
+                return self._display_probe.wait(timeout=1) == 0
+            except subprocess.TimeoutExpired:
+                self._display_probe.kill()
+                return False
+        # For macOS, assume we have a display if we're not testing
+        return self.macos
 
 
-def is_linux() -> bool:
-    """
-    Check if the current system is Linux.
-
-    Uses PyInfra's Kernel fact to determine the OS when possible,
-    with fallback to platform.system() when called outside a deploy context.
-    """
-    try:
-        from pyinfra.context import ctx_host
-        from pyinfra.facts.server import Kernel
-
-        # Check if we're in a deploy context
-        host = ctx_host.get()
-        if host is not None:
-            return host.get_fact(Kernel) == "Linux"
-    except (ImportError, AttributeError):
-        pass
+# HostProfile per host name ("" outside a deploy context)
+_profiles: dict[str, HostProfile] = {}
 
-    # Fallback to platform.system() if PyInfra isn't available or initialized
-    return platform.system() == "Linux"
 
+def _local_profile() -> HostProfile:
+    """The profile of the machine running pyinfra, without any facts."""
+    from settings import settings
 
-def is_nixos() -> bool:
-    """
-    Check if the current system is NixOS.
-    
-    First checks /etc/os-release for ID=nixos, then falls back to checking if
-    /run/current-system exists, which is a NixOS-specific path.
-    """
-    if not is_linux():
-        return False
-        
-    # Check /etc/os-release first (most reliable)
+    kernel = platform.system()
+    distro = ""
     try:
         with open("/etc/os-release", "r") as f:
             for line in f:
-                if line.strip() == 'ID=nixos':
-                    return True
+                if line.startswith("ID="):
+                    distro = line.strip()[3:].strip('"')
     except (FileNotFoundError, PermissionError):
         pass
-        
-    # Fallback to checking if /run/current-system exists (NixOS-specific)
-    return Path("/run/current-system").exists()
 
-
-def has_display() -> bool:
-    """
-    Check if there's a graphical display available.
-
-    Uses PyInfra's HasGui fact on Linux when possible, with fallback to
-    a combination of environment checks and shell commands.
-    Handles macOS and Docker testing environments properly.
-    """
-    # Always return False in Docker testing
-    if settings.docker_testing:
-        return False
-
-    if is_linux():
-        # Try to use PyInfra's HasGui fact
+    # Ping GNOME Shell in the background; HostProfile.gui waits for the answer
+    display_probe = None
+    if kernel == "Linux" and os.environ.get("DISPLAY") and not settings.docker_testing:
         try:
-            from pyinfra.context import ctx_host
-            from pyinfra.facts.server import HasGui
-
-            # Check if we're in a deploy context
-            host = ctx_host.get()
-            if host is not None:
-                return host.get_fact(HasGui)
-        except (ImportError, AttributeError):
-            pass
-
-        # Fallback to our custom checks if PyInfra isn't available
-
-        # Check for DISPLAY environment variable
-        if not os.environ.get("DISPLAY"):
-            return False
-
-        # Check if we're in a Desktop environment
-        try:
-            result = subprocess.run(
+            display_probe = subprocess.Popen(
                 [
                     "dbus-send",
                     "--session",
@@ -132,15 +104,85 @@ def has_display() -> bool:
                     "/org/gnome/Shell",
                     "org.freedesktop.DBus.Peer.Ping",
                 ],
-                capture_output=True,
-                timeout=1,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
             )
-            return result.returncode == 0
-        except (subprocess.SubprocessError, FileNotFoundError):
+        except FileNotFoundError:
             pass
 
-    # For macOS, assume we have a display if we're not testing
-    return is_macos()
+    return HostProfile(
+        kernel=kernel,
+        distro=distro,
+        # /run/current-system is NixOS-specific, for os-releases without ID=nixos
+        nixos=kernel == "Linux"
+        and (distro == "nixos" or Path("/run/current-system").exists()),
+        docker_testing=settings.docker_testing,
+        _display_probe=display_probe,
+        _gui=False if kernel == "Linux" and display_probe is None else None,
+    )
+
+
+def host_profile() -> HostProfile:
+    """
+    The current host's HostProfile, built on first use and reused after that.
+
+    Deploys read everything platform-related from here (is_linux and friends
+    are shorthands for it), so facts are only consulted once per host.
+    """
+    from pyinfra.context import ctx_host
+
+    host = ctx_host.get()
+    name = host.name if host is not None else ""
+    if name in _profiles:
+        return _profiles[name]
 
+    from settings import settings
 
-settings = Settings()
+    if host is None:
+        profile = _local_profile()
+    else:
+        from pyinfra.facts.server import HasGui
+
+        from facts import Kernel, OsRelease, get_fact
+
+        kernel = get_fact(Kernel)
+        distro = get_fact(OsRelease).get("id", "") if kernel == "Linux" else ""
+        profile = HostProfile(
+            kernel=kernel,
+            distro=distro,
+            nixos=distro == "nixos",
+            docker_testing=settings.docker_testing,
+            _gui=(
+                bool(get_fact(HasGui))
+                if kernel == "Linux" and not settings.docker_testing
+                else None
+            ),
+        )
+
+    _profiles[name] = profile
+    return profile
+
+
+def is_macos() -> bool:
+    """Check if the current system is macOS (see host_profile)."""
+    return host_profile().macos
+
+
+def is_linux() -> bool:
+    """Check if the current system is Linux (see host_profile)."""
+    return host_profile().linux
+
+
+def is_nixos() -> bool:
+    """Check if the current system is NixOS (see host_profile)."""
+    return host_profile().nixos
+
+
+def has_display() -> bool:
+    """
+    Check if there's a graphical display available (see host_profile).
+
+    Always False in Docker testing. On Linux this is PyInfra's HasGui fact, or
+    outside a deploy context a ping to GNOME Shell over D-Bus; on macOS True.
+    """
+    return host_profile().gui
@@ -0,0 +1,107 @@
+"""
+deploys.py
+
+Registry of the deploys, by name, resolved lazily.
+
+Deploy modules pull in pyinfra operations, facts and settings as they're
+imported, so nothing is imported here: the registry lists the @deploy functions
+of DEPLOY_MODULES from their source, and resolve() imports a deploy's module the
+first time one of its deploys is asked for. Running a single deploy then only
+pays for its own module.
+"""
+
+import ast
+import importlib
+import os
+import sys
+from functools import cache
+from pathlib import Path
+from typing import Any, Callable
+
+# Modules defining deploys
+DEPLOY_MODULES = ("env_setup", "gnome", "packages")
+
+
+def _deploy_names(module: str) -> tuple[str, ...]:
+    """
+    The public functions decorated with @deploy in a deploy module, read from its
+    source instead of importing it.
+    """
+    tree = ast.parse(Path(__file__).with_name(f"{module}.py").read_text())
+    return tuple(
+        node.name
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef)
+        and not node.name.startswith("_")
+        and any(
+            isinstance(decorator, ast.Call)
+            and isinstance(decorator.func, ast.Name)
+            and decorator.func.id == "deploy"
+            for decorator in node.decorator_list
+        )
+    )
+
+
+@cache
+def _registry() -> dict[str, str]:
+    """Deploy name -> module defining it."""
+    return {
+        function: module
+        for module in DEPLOY_MODULES
+        for function in _deploy_names(module)
+    }
+
+
+def __getattr__(name: str) -> Any:
+    # DEPLOYS (the registry) is only built once something reads it
+    if name == "DEPLOYS":
+        return _registry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def qualified_name(name: str) -> str:
+    """
+    ``module.function`` for a registered deploy, given with or without its
+    module (``setup_fish`` or ``env_setup.setup_fish``). Imports nothing.
+    Raises KeyError for names that aren't registered.
+    """
+    module, _, function = name.rpartition(".")
+    registry = _registry()
+    if function not in registry or module not in ("", registry[function]):
+        raise KeyError(f"Unknown deploy: {name} (see deploys.DEPLOYS)")
+    return f"{registry[function]}.{function}"
+
+
+def resolve(name: str) -> Callable[[], None]:
+    """Get a deploy function by name (see qualified_name), importing its module."""
+    module, _, function = qualified_name(name).partition(".")
+    return getattr(importlib.import_module(module), function)
+
+
+def selected() -> list[str]:
+    """Deploys picked with DEPLOYS=name,name (empty list: run everything)."""
+    return [name for name in os.environ.get("DEPLOYS", "").split(",") if name]
+
+
+def run(*names: str) -> None:
+    """Resolve and run the given deploys in order."""
+    for name in names:
+        resolve(name)()
+
+
+def finish() -> None:
+    """
+    Queue the operations that close a run, after whichever deploys ran.
+
+    They only concern modules the deploys imported, so nothing is imported here
+    either: a single fsync barrier for dpkg's unsafe_io writes when apt_fast was
+    used, and a single brew cleanup when brew_fast was (each a no-op when
+    there's nothing to flush or clean up).
+    """
+    apt_fast = sys.modules.get("apt_fast")
+    if apt_fast:
+        apt_fast.sync(name="Flush unsafe dpkg writes to disk", _sudo=True)
+
+    brew_fast = sys.modules.get("brew_fast")
+    if brew_fast:
+        brew_fast.cleanup(name="Clean up Homebrew", _env=brew_fast.BREW_ENV)
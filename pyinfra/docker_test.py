@@ -6,6 +6,11 @@ A Python-based Docker testing harness for the workspace setup scripts.
 This script replaces the Bash-based docker-test.sh with a more robust implementation
 using the Typer CLI framework.
 
+Only plain-HTTP traffic (the Ubuntu archive and apt repositories served over
+HTTP) is cached by --cache: HTTPS, including the Homebrew installer, rustup,
+juliaup and the Zoom and Firefox downloads, is tunneled through the proxy and
+fetched from the internet on every run. --brew-cache keeps Homebrew's bottles.
+
 Usage:
     python docker_test.py [OPTIONS] [MODULE_FUNCTION]
 """
@@ -13,16 +18,52 @@ Usage:
 import os
 import subprocess
 import sys
+import tempfile
+from pathlib import Path
 from typing import List, Optional
 
 import typer
 from rich.console import Console
 from rich.panel import Panel
 
+import deploys
+
 # Initialize Typer app and rich console
 app = typer.Typer(help="Docker testing harness for workspace setup")
 console = Console()
 
+# Caching proxy shared by test containers (see start_cache_proxy)
+CACHE_NETWORK = "workspace-test"
+CACHE_CONTAINER = "workspace-test-cache"
+CACHE_VOLUME = "workspace-test-cache"
+CACHE_IMAGE = "ubuntu/squid:latest"
+CACHE_PROXY = f"http://{CACHE_CONTAINER}:3128"
+CACHE_ACCESS_LOG = "/var/log/squid/access.log"
+
+# Homebrew download cache shared by test containers (brew_fast.BREW_CACHE_DIR)
+BREW_CACHE_VOLUME = "workspace-test-brew"
+BREW_CACHE_DIR = "/var/cache/pyinfra/brew"
+
+# Keep .debs (immutable, versioned filenames) forever, always revalidate indexes
+SQUID_CONF = f"""\
+http_port 3128
+http_access allow all
+cache_dir ufs /var/spool/squid 20000 16 256
+cache_mem 256 MB
+maximum_object_size 2 GB
+access_log daemon:{CACHE_ACCESS_LOG} squid
+refresh_pattern -i \\.(deb|udeb|tar\\.(gz|xz|zst)|bottle\\..*)$ 129600 100% 129600 refresh-ims override-expire
+refresh_pattern -i (/Release|/InRelease|/Packages(\\.gz|\\.xz)?)$ 0 0% 0
+refresh_pattern . 0 20% 4320
+"""
+
+# sudo resets the environment, so apt/apt-fast under sudo wouldn't see the proxy
+SUDO_KEEP_PROXY = (
+    "printf '%s\\n' 'Defaults env_keep += http_proxy' 'Defaults env_keep += https_proxy'"
+    " 'Defaults env_keep += HTTP_PROXY' 'Defaults env_keep += HTTPS_PROXY'"
+    " | sudo tee /etc/sudoers.d/proxy >/dev/null && sudo chmod 0440 /etc/sudoers.d/proxy"
+)
+
 
 def run_command(
     command: str, check: bool = True, capture_output: bool = True
@@ -53,12 +94,77 @@ def build_docker_image(image_name: str) -> None:
     run_command(f"docker build -t {image_name} .", capture_output=False)
 
 
-def get_modules() -> List[str]:
-    """Get a list of available Python modules in the current directory."""
+def start_cache_proxy() -> None:
+    """Start the caching proxy container (if needed) on the test network."""
+    if run_command(f"docker network inspect {CACHE_NETWORK}", check=False).returncode:
+        run_command(f"docker network create {CACHE_NETWORK}")
+
+    running = run_command(
+        f"docker ps -q --filter name=^{CACHE_CONTAINER}$", check=False
+    ).stdout.strip()
+    if running:
+        return
+
+    console.print("[bold blue]Starting caching proxy...[/]")
+    squid_conf = Path(tempfile.gettempdir()) / "workspace-test-squid.conf"
+    squid_conf.write_text(SQUID_CONF)
+    run_command(
+        f"docker run -d --rm --name {CACHE_CONTAINER} --network {CACHE_NETWORK}"
+        f" -v {CACHE_VOLUME}:/var/spool/squid"
+        f" -v {squid_conf}:/etc/squid/squid.conf:ro {CACHE_IMAGE}"
+    )
+
+
+def cache_log_length() -> int:
+    """Number of requests in the proxy's access log so far."""
+    result = run_command(
+        f"docker exec {CACHE_CONTAINER} sh -c 'wc -l < {CACHE_ACCESS_LOG}'",
+        check=False,
+    )
+    return int(result.stdout.strip() or 0) if result.returncode == 0 else 0
+
+
+def print_cache_summary(start_line: int) -> None:
+    """Summarize cache hits for the requests logged after start_line."""
     result = run_command(
-        "ls -1 *.py | grep -v 'main\\|test\\|config' | sed 's/\\.py$//'"
+        f"docker exec {CACHE_CONTAINER} tail -n +{start_line + 1} {CACHE_ACCESS_LOG}",
+        check=False,
+    )
+    if result.returncode != 0:
+        console.print("[yellow]Could not read the proxy access log.[/]")
+        return
+
+    requests = hits = tunneled = 0
+    bytes_total = bytes_hit = 0
+    for line in result.stdout.splitlines():
+        # squid native format: time elapsed client code/status bytes method url ...
+        fields = line.split()
+        if len(fields) < 7:
+            continue
+        code, size, method = fields[3].split("/")[0], int(fields[4]), fields[5]
+        if method == "CONNECT":
+            # HTTPS is tunneled through the proxy, it can't be cached
+            tunneled += 1
+            continue
+        requests += 1
+        bytes_total += size
+        if "HIT" in code or code == "TCP_REFRESH_UNMODIFIED":
+            hits += 1
+            bytes_hit += size
+
+    if not requests:
+        console.print("[yellow]No cacheable requests went through the proxy.[/]")
+        return
+
+    console.print(
+        Panel.fit(
+            f"Requests: {hits}/{requests} hits ({hits / requests:.0%})\n"
+            f"Bytes: {bytes_hit / 2**20:.1f}/{bytes_total / 2**20:.1f} MiB from cache"
+            f" ({bytes_hit / max(bytes_total, 1):.0%})\n"
+            f"HTTPS tunnels (not cached): {tunneled}",
+            title="Download cache",
+        )
     )
-    return result.stdout.strip().split("\n")
 
 
 def run_docker_container(
@@ -67,6 +173,8 @@ def run_docker_container(
     interactive: bool = False,
     ssh_agent: bool = False,
     env_vars: Optional[dict] = None,
+    network: Optional[str] = None,
+    volumes: Optional[dict] = None,
 ) -> None:
     """Run a Docker container with the specified command."""
     # Base docker run command
@@ -87,6 +195,14 @@ def run_docker_container(
             f" -v {ssh_sock}:/tmp/ssh_auth_sock -e SSH_AUTH_SOCK=/tmp/ssh_auth_sock"
         )
 
+    # Mount named volumes (volume name -> container path)
+    if volumes:
+        for volume, path in volumes.items():
+            docker_cmd += f" -v {volume}:{path}"
+
+    if network:
+        docker_cmd += f" --network {network}"
+
     # Add environment variables
     if env_vars:
         for key, value in env_vars.items():
@@ -106,19 +222,11 @@ def run_docker_container(
 
 @app.command()
 def list_modules():
-    """List available modules for testing."""
+    """List available modules and their deploys for testing."""
     console.print("[bold green]Available modules:[/]")
-
-    image_name = "workspace-test"
-    if not check_docker_image_exists(image_name):
-        build_docker_image(image_name)
-
-    # Get modules from the Docker image
-    run_docker_container(
-        image_name=image_name,
-        command="ls -1 *.py | grep -v 'main\\|test\\|config' | sed 's/\\.py$//'",
-        interactive=False,
-    )
+    for module in deploys.DEPLOY_MODULES:
+        names = [name for name, owner in deploys.DEPLOYS.items() if owner == module]
+        console.print(f"[bold]{module}[/]: {', '.join(names)}")
 
 
 @app.command()
@@ -144,6 +252,17 @@ def run(
         "--dotfiles/--no-dotfiles",
         help="Include dotfiles setup (default: yes for full setup, no for specific function)",
     ),
+    cache: bool = typer.Option(
+        False,
+        "--cache",
+        "-c",
+        help="Route downloads through a proxy caching the plain-HTTP ones",
+    ),
+    brew_cache: bool = typer.Option(
+        False,
+        "--brew-cache",
+        help="Keep Homebrew's download cache in a named volume shared across runs",
+    ),
 ):
     """Run PyInfra modules in a Docker container.
 
@@ -152,6 +271,14 @@ def run(
     Rebuilding is only necessary when the Dockerfile or dependencies change.
 
     You can specify multiple module.function pairs to run them in sequence.
+
+    With --cache, plain HTTP downloads (the Ubuntu archive, most .debs) are
+    served from a proxy container whose cache lives in a named volume, so repeated
+    runs are bounded by install time instead of network time. HTTPS downloads
+    go through it uncached.
+
+    With --brew-cache, Homebrew's download cache is a named volume, so a second
+    run with the same formulae pours every bottle without downloading it.
     """
     image_name = "workspace-test"
 
@@ -187,23 +314,24 @@ def run(
         # Process module functions
         module_functions = []
         for func in module_function:
-            # Validate each module.function pair
-            if "." not in func:
+            # Validate each deploy against the registry, without importing it
+            try:
+                module_functions.append(deploys.qualified_name(func))
+            except KeyError:
                 console.print(
-                    f"[bold red]Error:[/] '{func}' is not a valid module.function pair.\n"
-                    "Please specify in format 'module.function' (e.g., 'env_setup.setup_fish')."
+                    f"[bold red]Error:[/] '{func}' is not a known deploy.\n"
+                    "Please specify a deploy as 'function' or 'module.function'"
+                    " (e.g., 'env_setup.setup_fish'); see 'list-modules'."
                 )
                 sys.exit(1)
-            module_functions.append(func)
 
         # Build command to run specified module.functions
         funcs_str = " ".join(module_functions)
         console.print(f"[bold blue]Running functions: {funcs_str} in Docker...[/]")
 
-        # Create a combined command for all module functions
-        command = " && ".join(
-            [f"pyinfra @local -vy {func}" for func in module_functions]
-        )
+        # One run of main.py through the registry, so it ends like a full run
+        # (see deploys.finish)
+        command = f"DEPLOYS={','.join(module_functions)} pyinfra @local -vy main.py"
     else:
         # Full setup
         console.print(
@@ -220,14 +348,38 @@ def run(
     if interactive:
         command += " && bash"
 
+    env_vars = None
+    network = None
+    cache_start = None
+    if cache:
+        start_cache_proxy()
+        cache_start = cache_log_length()
+        network = CACHE_NETWORK
+        env_vars = {
+            key: CACHE_PROXY
+            for key in ("http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY")
+        }
+        command = f"{SUDO_KEEP_PROXY} && {command}"
+
+    volumes = None
+    if brew_cache:
+        volumes = {BREW_CACHE_VOLUME: BREW_CACHE_DIR}
+
     # Run the container
-    run_docker_container(
-        image_name=image_name,
-        command=command,
-        interactive=interactive
-        or run_dotfiles,  # Interactive mode required for dotfiles
-        ssh_agent=run_dotfiles,
-    )
+    try:
+        run_docker_container(
+            image_name=image_name,
+            command=command,
+            interactive=interactive
+            or run_dotfiles,  # Interactive mode required for dotfiles
+            ssh_agent=run_dotfiles,
+            env_vars=env_vars,
+            network=network,
+            volumes=volumes,
+        )
+    finally:
+        if cache_start is not None:
+            print_cache_summary(cache_start)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 from pyinfra.api.deploy import deploy
-from pyinfra.context import host
 from pyinfra.operations import files, server
 
 from config import HOME, USER
@@ -44,10 +43,10 @@ def setup_directories() -> None:
 @deploy("Setup Python Environment")
 def setup_python_env() -> None:
     # Let's first check if we need to install Python 3.13
-    from facts import UvInstallation
+    from facts import UvInstallation, get_fact
 
     # Get information about current UV installation
-    uv_info = host.get_fact(UvInstallation)
+    uv_info = get_fact(UvInstallation)
 
     # Check if Python 3.13 is already installed using a separate function
     python_check = server.shell(
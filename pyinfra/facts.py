@@ -1,23 +1,302 @@
+import configparser
+import inspect
+import json
+import os
 import platform
-from typing import Iterable
+import re
+import shlex
+import time
+import tomllib
+from pathlib import Path
+from typing import Any, Iterable
 
-from pyinfra.api.facts import FactBase
+from pyinfra.api.command import StringCommand
+from pyinfra.api.facts import FactBase, ShortFactBase
+from pyinfra.context import host
+from pyinfra.facts import server
+
+# Printed with the exit status after each command of a CompositeFact
+COMPOSITE_FACT_DELIMITER = "@@pyinfra-composite-fact"
+
+# Exit status of a CompositeFact command whose cache_files are unchanged
+CACHE_HIT_STATUS = 111
+
+# Fact values kept across runs (see gather_facts), on the machine running pyinfra
+FACT_CACHE_FILE = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "pyinfra"
+    / "facts.json"
+)
+
+# Fact values loaded by gather_facts, per host: (fact class, arguments) -> value
+_gathered: dict[str, dict[tuple, Any]] = {}
+
+# FACT_CACHE_FILE's contents: host -> fact key -> {"value", "time", "signature"}
+_fact_cache: dict[str, dict[str, dict]] | None = None
+
+# Printed before each installation's repo/config in FlatpakRemotes' output
+FLATPAK_INSTALLATION_MARKER = "@@flatpak-installation"
+
+# Printed first in UvInstallation's output when uv is installed
+UV_INSTALLED_MARKER = "@@uv-installed"
+
+# Printed before the Project.toml and Manifest.toml in JuliaPackages' output
+JULIA_PROJECT_MARKER = "@@julia-project"
+JULIA_MANIFEST_MARKER = "@@julia-manifest"
+
+# The depot JuliaPackages reads, the first entry of JULIA_DEPOT_PATH (shell)
+JULIA_DEPOT = '$(d="${JULIA_DEPOT_PATH%%:*}"; echo "${d:-$HOME/.julia}")'
+
+# Hash of everything an apt upgrade decision depends on: the downloaded package
+# lists (name, size, mtime) and dpkg's status file
+APT_STATE_FINGERPRINT_COMMAND = (
+    "{ find /var/lib/apt/lists -maxdepth 1 -type f ! -name lock"
+    " -printf '%f %s %T@\\n' | sort; stat -c '%n %s %Y' /var/lib/dpkg/status; }"
+    " 2>/dev/null | sha256sum | cut -d' ' -f1"
+)
 
 
 class FlatpakRemotes(FactBase):
     """
-    Returns a list of configured Flatpak remotes.
+    Returns the enabled Flatpak remotes as a dict of
+    name -> {"url": ..., "installation": "system" | "user"}, read from the
+    installations' repo/config. None if flatpak isn't installed.
     Linux-only.
     """
 
+    cache_files = (
+        "${FLATPAK_SYSTEM_DIR:-/var/lib/flatpak}/repo/config",
+        "${FLATPAK_USER_DIR:-$HOME/.local/share/flatpak}/repo/config",
+    )
+
     def command(self) -> str:
-        return "flatpak remotes --show-details 2>/dev/null || true"
+        # Grouped, so pyinfra's requires_command guard covers all of it
+        return (
+            f"{{ echo {FLATPAK_INSTALLATION_MARKER} system; "
+            'cat "${FLATPAK_SYSTEM_DIR:-/var/lib/flatpak}/repo/config" 2>/dev/null; '
+            f"echo {FLATPAK_INSTALLATION_MARKER} user; "
+            'cat "${FLATPAK_USER_DIR:-$HOME/.local/share/flatpak}/repo/config" 2>/dev/null; '
+            "true; }"
+        )
 
     def requires_command(self) -> str:
         return "flatpak"
 
+    def process(self, output: Iterable[str]) -> dict[str, dict[str, str]]:
+        configs: dict[str, list[str]] = {}
+        lines: list[str] = []
+        for line in output:
+            if line.startswith(FLATPAK_INSTALLATION_MARKER):
+                lines = configs.setdefault(line.split()[1], [])
+            else:
+                lines.append(line)
+
+        remotes: dict[str, dict[str, str]] = {}
+        # System remotes first, like `flatpak remotes` lists them
+        for installation, lines in configs.items():
+            config = configparser.ConfigParser(interpolation=None, strict=False)
+            config.read_string("\n".join(lines))
+            for section in config.sections():
+                if not section.startswith('remote "'):
+                    continue
+                remote = config[section]
+                if remote.getboolean("xa.disable", fallback=False):
+                    continue
+                remotes.setdefault(
+                    section[len('remote "') : -1],
+                    {"url": remote.get("url", ""), "installation": installation},
+                )
+        return remotes
+
+
+class FlatpakInstalledRefs(FactBase):
+    """
+    Returns the refs deployed in a Flatpak installation ("system" or "user"),
+    like ``app/org.zotero.Zotero/x86_64/stable``, from one listing of its
+    directory rather than ``flatpak list``. Linux-only.
+    """
+
+    def command(self, installation: str = "system") -> str:
+        directory = (
+            "${FLATPAK_SYSTEM_DIR:-/var/lib/flatpak}"
+            if installation == "system"
+            else "${FLATPAK_USER_DIR:-$HOME/.local/share/flatpak}"
+        )
+        # Every deployed ref has an `active` link to its deployed commit
+        return (
+            f'ls -d "{directory}"/app/*/*/*/active'
+            f' "{directory}"/runtime/*/*/*/active 2>/dev/null || true'
+        )
+
     def process(self, output: Iterable[str]) -> list[str]:
-        return [line.split()[0] for line in output if line.strip()]
+        return sorted("/".join(line.split("/")[-5:-1]) for line in output)
+
+    @staticmethod
+    def default() -> list[str]:
+        return []
+
+
+class AptFastConfig(FactBase):
+    """
+    Returns the shell variables set in /etc/apt-fast.conf as a dict.
+    Empty if apt-fast isn't installed yet.
+    Linux-only.
+    """
+
+    def command(self) -> str:
+        return "cat /etc/apt-fast.conf 2>/dev/null || true"
+
+    def process(self, output: Iterable[str]) -> dict[str, str]:
+        config = {}
+        for line in output:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            config[key.strip()] = value.strip().strip("'\"")
+        return config
+
+    @staticmethod
+    def default() -> dict[str, str]:
+        return {}
+
+
+class DpkgPackageIndex(FactBase):
+    """
+    Returns installed dpkg packages as a dict of name -> set of versions.
+    Same shape as pyinfra's DebPackages, but split line by line from a fixed
+    dpkg-query format instead of regex-matching every line of ``dpkg -l``.
+    Linux-only.
+    """
+
+    def command(self) -> str:
+        return "dpkg-query -W -f='${db:Status-Abbrev}\\t${Package}\\t${Version}\\n'"
+
+    def requires_command(self) -> str:
+        return "dpkg-query"
+
+    def process(self, output: Iterable[str]) -> dict[str, set[str]]:
+        packages: dict[str, set[str]] = {}
+        for line in output:
+            status, _, rest = line.partition("\t")
+            # "ii" installed, "hi" installed and held; anything else isn't usable
+            if status[:2] not in ("ii", "hi"):
+                continue
+            name, _, version = rest.partition("\t")
+            packages.setdefault(name, set()).add(version.strip())
+        return packages
+
+    @staticmethod
+    def default() -> dict[str, set[str]]:
+        return {}
+
+
+class AptStateFingerprint(FactBase):
+    """
+    Returns a fingerprint of apt's package lists and dpkg's status file, and the
+    one last recorded to ``path`` (None if nothing was recorded yet).
+    Linux-only.
+    """
+
+    def command(self, path: str) -> str:
+        return f"{APT_STATE_FINGERPRINT_COMMAND}; cat {path} 2>/dev/null || true"
+
+    def process(self, output: Iterable[str]) -> dict:
+        lines = [line.strip() for line in output]
+        return {
+            "current": lines[0] if lines else None,
+            "recorded": lines[1] if len(lines) > 1 and lines[1] else None,
+        }
+
+
+class AptSourceUris(FactBase):
+    """
+    Returns the set of repository URIs in apt's sources (one-line and deb822
+    formats), without trailing slashes.
+    Linux-only.
+    """
+
+    def command(self) -> str:
+        return (
+            "cat /etc/apt/sources.list /etc/apt/sources.list.d/*.list"
+            " /etc/apt/sources.list.d/*.sources 2>/dev/null || true"
+        )
+
+    def process(self, output: Iterable[str]) -> set[str]:
+        uris = set()
+        for line in output:
+            words = line.split("#", 1)[0].split()
+            if words[:1] in (["deb"], ["deb-src"]):
+                words = words[1:]
+                # Skip the [arch=... signed-by=...] options, if any
+                if words and words[0].startswith("["):
+                    while words and not words.pop(0).endswith("]"):
+                        pass
+                uris.update(words[:1])
+            elif words[:1] == ["URIs:"]:
+                uris.update(words[1:])
+        return {uri.rstrip("/") for uri in uris}
+
+
+class MirrorProbe(FactBase):
+    """
+    Probes each mirror by fetching ``path`` from it (e.g. dists/noble/InRelease).
+    Returns a dict of mirror -> {"latency": seconds to the first byte,
+    "throughput": bytes per second}, or None where the fetch failed.
+    Cross-platform.
+    """
+
+    def command(self, mirrors: tuple[str, ...], path: str, timeout: int = 5) -> str:
+        probes = [
+            f"echo {mirror} $(curl -sSf -o /dev/null --max-time {timeout}"
+            " -w '%{time_starttransfer} %{time_total} %{size_download}'"
+            f" {mirror.rstrip('/')}/{path} 2>/dev/null || echo failed)"
+            for mirror in mirrors
+        ]
+        return "; ".join(probes)
+
+    def requires_command(self, *args, **kwargs) -> str:
+        return "curl"
+
+    def process(self, output: Iterable[str]) -> dict[str, dict | None]:
+        results: dict[str, dict | None] = {}
+        for line in output:
+            mirror, *timings = line.split()
+            try:
+                first_byte, total, size = (float(value) for value in timings)
+            except ValueError:
+                results[mirror] = None
+                continue
+            results[mirror] = {
+                "latency": first_byte,
+                "throughput": size / max(total - first_byte, 1e-6),
+            }
+        return results
+
+
+class CachedDownloadModified(FactBase):
+    """
+    Returns whether url has to be downloaded again to refresh the cached copy at
+    path: True when path is missing, or when a conditional HEAD request (with
+    the ETag saved in etag, else path's modification time) isn't answered with
+    304 Not Modified.
+    Cross-platform.
+    """
+
+    def command(self, url: str, path: str, etag: str) -> str:
+        return (
+            f"if [ -e {path} ]; then curl -sSL -I -o /dev/null -w '%{{http_code}}'"
+            f" $([ -s {etag} ] && echo '--etag-compare {etag}' || echo '-z {path}')"
+            f" {shlex.quote(url)}; else echo missing; fi"
+        )
+
+    def process(self, output: Iterable[str]) -> bool:
+        return "".join(output).strip() != "304"
+
+    @staticmethod
+    def default() -> bool:
+        # No output at all, e.g. without curl: let the download say why
+        return True
 
 
 class UserGroups(FactBase):
@@ -26,6 +305,8 @@ class UserGroups(FactBase):
     Cross-platform.
     """
 
+    cache_files = ("/etc/group",)
+
     def command(self) -> str:
         return "groups"
 
@@ -40,6 +321,9 @@ class KernelParameters(FactBase):
     Linux-only.
     """
 
+    # Only changes with a reboot
+    cache_files = ("/proc/sys/kernel/random/boot_id",)
+
     def command(self) -> str:
         return "cat /proc/cmdline 2>/dev/null || true"
 
@@ -48,12 +332,58 @@ class KernelParameters(FactBase):
         return first_line.split() if first_line else []
 
 
+class OpenFileLimit(FactBase):
+    """
+    Returns how far a shell on the host can raise its open file limit
+    (RLIMIT_NOFILE): {"soft": n, "hard": n}, None meaning unlimited. On macOS
+    the hard limit is capped by kern.maxfilesperproc.
+    """
+
+    def command(self) -> str:
+        return (
+            "ulimit -Sn; ulimit -Hn; sysctl -n kern.maxfilesperproc 2>/dev/null || true"
+        )
+
+    def process(self, output: Iterable[str]) -> dict[str, int | None]:
+        soft, hard, *kernel = [line.strip() for line in output if line.strip()]
+        limits = {
+            "soft": None if soft == "unlimited" else int(soft),
+            "hard": None if hard == "unlimited" else int(hard),
+        }
+        if kernel:
+            limits["hard"] = min(limits["hard"] or int(kernel[0]), int(kernel[0]))
+        return limits
+
+
+class BrewLastUpdate(FactBase):
+    """
+    Returns how many seconds ago Homebrew last fetched its repository (the
+    last ``brew update``), or None if it never did.
+    """
+
+    def command(self) -> str:
+        return (
+            'f="$(brew --repository)/.git/FETCH_HEAD";'
+            ' [ -f "$f" ] && echo "$(date +%s) $(stat -c %Y "$f" 2>/dev/null || stat -f %m "$f")"'
+            " || true"
+        )
+
+    def requires_command(self) -> str:
+        return "brew"
+
+    def process(self, output: Iterable[str]) -> int:
+        now, updated = next(iter(output)).split()
+        return int(now) - int(updated)
+
+
 class DebsigPolicies(FactBase):
     """
     Returns a list of configured debsig policies.
     Linux-only.
     """
 
+    cache_files = ("/etc/debsig/policies",)
+
     def command(self) -> str:
         # The original command doesn't work correctly if the directory doesn't exist
         # We need to ensure the command returns an empty string in case of errors
@@ -74,6 +404,9 @@ class DockerConfiguration(FactBase):
     Different paths/behavior for Linux/macOS.
     """
 
+    cache_ttl = 24 * 60 * 60
+    cache_files = ("/etc/docker/daemon.json",)
+
     def command(self) -> str:
         if platform.system() == "Darwin":
             return 'cat ~/Library/Group\\ Containers/group.com.docker/settings.json 2>/dev/null || echo "{}"'
@@ -90,6 +423,8 @@ class DefaultShell(FactBase):
     Returns the default shell for a user.
     """
 
+    cache_files = ("/etc/passwd",)
+
     def command(self, user: str) -> str:
         return f"getent passwd {user} | cut -d: -f7"
 
@@ -99,55 +434,203 @@ class DefaultShell(FactBase):
 
 class UvInstallation(FactBase):
     """
-    Returns information about uv installation and tools.
+    Returns whether uv is installed and its tools, as
+    {"installed": bool, "tools": {name: {"version": ..., "binaries": [...]}}}.
+
+    Tools are read from their receipts (uv-receipt.toml) in the tools directory,
+    and versions from the dist-info each tool's environment has, so uv itself
+    isn't run.
     """
 
+    cache_ttl = 60 * 60
+    cache_files = ("${UV_TOOL_DIR:-${XDG_DATA_HOME:-$HOME/.local/share}/uv/tools}",)
+
     def command(self) -> str:
-        return "uv --version && uv tool list 2>/dev/null || true"
+        # One ls and one grep for all tools: "<tool>/lib/.../<dist>.dist-info"
+        # and "<tool>/uv-receipt.toml:<line>"
+        return (
+            '{ command -v uv || [ -x "$HOME/.local/bin/uv" ]; } >/dev/null'
+            f" && echo {UV_INSTALLED_MARKER}; "
+            '( cd "${UV_TOOL_DIR:-${XDG_DATA_HOME:-$HOME/.local/share}/uv/tools}"'
+            " && { ls -d */lib/python*/site-packages/*.dist-info;"
+            " grep -H '' */uv-receipt.toml; } ) 2>/dev/null; true"
+        )
 
     def process(self, output: Iterable[str]) -> dict:
-        tools = {}
         installed = False
-        current_tool = None
+        receipts: dict[str, list[str]] = {}
+        dists: dict[str, dict[str, str]] = {}
 
         for line in output:
-            if line.startswith("uv"):
+            if line == UV_INSTALLED_MARKER:
                 installed = True
-                version = line.split()[1]
-            elif " v" in line:  # tool header with version
-                current_tool, version = line.split(" v")
-                tools[current_tool] = {"version": version, "binaries": []}
-            elif line.startswith("- "):  # binary entry
-                if current_tool:
-                    tools[current_tool]["binaries"].append(line[2:])
+            elif "/uv-receipt.toml:" in line:
+                tool, _, line = line.partition("/uv-receipt.toml:")
+                receipts.setdefault(tool, []).append(line)
+            elif line.endswith(".dist-info"):
+                # <name>-<version>.dist-info, name normalized to underscores
+                tool, *_, dist = line.split("/")
+                name, _, version = dist.removesuffix(".dist-info").rpartition("-")
+                dists.setdefault(tool, {})[name.lower()] = version
+
+        tools = {}
+        for tool, lines in receipts.items():
+            receipt = tomllib.loads("\n".join(lines)).get("tool", {})
+            requirements = receipt.get("requirements") or [{"name": tool}]
+            package = re.sub(r"[-_.]+", "_", requirements[0]["name"]).lower()
+            tools[tool] = {
+                "version": dists.get(tool, {}).get(package),
+                "binaries": [entry["name"] for entry in receipt.get("entrypoints", [])],
+            }
 
         return {"installed": installed, "tools": tools}
 
+    @staticmethod
+    def default() -> dict:
+        return {"installed": False, "tools": {}}
+
 
 class JuliaPackages(FactBase):
     """
-    Returns a list of installed Julia packages.
+    Returns the packages in the default Julia environment, as a dict of
+    name -> {"uuid": ..., "version": ...}.
+
+    The environment's Project.toml and Manifest.toml are read straight from the
+    depot (the first entry of JULIA_DEPOT_PATH, or ~/.julia) and parsed here, so
+    Julia itself isn't started. The default environment is the newest
+    ``environments/vX.Y`` directory. Julia is only asked when there's no such
+    environment, in case the depot lives somewhere else.
     """
 
-    def command(self) -> str:
-        return "julia -e 'using Pkg; println(join(keys(Pkg.project().dependencies), \",\"))' 2>/dev/null || true"
+    cache_files = (
+        f"{JULIA_DEPOT}/environments/*/Project.toml",
+        f"{JULIA_DEPOT}/environments/*/Manifest*.toml",
+    )
 
-    def requires_command(self) -> str:
-        return "julia"
+    def command(self) -> str:
+        return (
+            'depot="${JULIA_DEPOT_PATH%%:*}"; depot="${depot:-$HOME/.julia}"; '
+            'env=$(ls -d "$depot"/environments/v*/ 2>/dev/null | sort -V | tail -n1); '
+            'env="${env%/}"; '
+            'if [ -f "$env/Project.toml" ]; then '
+            f'echo {JULIA_PROJECT_MARKER}; cat "$env/Project.toml"; '
+            f"echo {JULIA_MANIFEST_MARKER}; "
+            'cat "$env/Manifest-${env##*/}.toml" 2>/dev/null || cat "$env/Manifest.toml" 2>/dev/null; '
+            "elif command -v julia >/dev/null; then "
+            "julia --startup-file=no -e 'using Pkg; for (uuid, pkg) in Pkg.dependencies(); "
+            'pkg.is_direct_dep && println(pkg.name, " ", uuid, " ", something(pkg.version, "")); end\' '
+            "2>/dev/null || true; fi"
+        )
+
+    def process(self, output: Iterable[str]) -> dict[str, dict[str, str | None]]:
+        lines = list(output)
+
+        if not lines or lines[0] != JULIA_PROJECT_MARKER:
+            # Julia's own listing: "<name> <uuid> <version>"
+            packages = {}
+            for line in lines:
+                name, uuid, *version = line.split()
+                packages[name] = {
+                    "uuid": uuid,
+                    "version": version[0] if version else None,
+                }
+            return packages
+
+        split = lines.index(JULIA_MANIFEST_MARKER)
+        project = tomllib.loads("\n".join(lines[1:split]))
+        manifest = tomllib.loads("\n".join(lines[split + 1 :]))
+        # Manifest format 2.0 nests entries under [deps]; 1.0 has them at the top
+        entries = (
+            manifest.get("deps", {}) if "manifest_format" in manifest else manifest
+        )
 
-    def process(self, output: Iterable[str]) -> list[str]:
-        packages = []
-        for line in output:
-            if line.strip():  # Skip empty lines
-                packages.extend(pkg.strip() for pkg in line.split(",") if pkg.strip())
+        packages = {}
+        for name, uuid in project.get("deps", {}).items():
+            version = next(
+                (
+                    entry.get("version")
+                    for entry in entries.get(name, [])
+                    if entry.get("uuid") == uuid
+                ),
+                None,
+            )
+            packages[name] = {"uuid": uuid, "version": version}
         return packages
 
+    @staticmethod
+    def default() -> dict[str, dict[str, str | None]]:
+        return {}
+
+
+class JuliaupConfig(FactBase):
+    """
+    Returns juliaup's configuration: {"dir": <juliaup directory>, "config": the
+    parsed juliaup.json (default channel, installed channels and versions)}.
+    None if juliaup isn't installed.
+    """
+
+    def command(self) -> str:
+        return (
+            'dir="${JULIAUP_DEPOT_PATH:-$HOME/.julia}/juliaup";'
+            ' [ -f "$dir/juliaup.json" ] && echo "$dir" && cat "$dir/juliaup.json"'
+            " || true"
+        )
+
+    def process(self, output: Iterable[str]) -> dict[str, Any]:
+        directory, *config = output
+        return {"dir": directory, "config": json.loads("\n".join(config))}
+
+
+class JuliaSysimageStamp(FactBase):
+    """
+    Returns what the sysimage at ``path`` was built from (see julia.sysimage),
+    or None if it hasn't been built.
+    """
+
+    def command(self, path: str) -> str:
+        stamp = shlex.quote(f"{path}.stamp")
+        return f"[ -f {shlex.quote(path)} ] && cat {stamp} 2>/dev/null || true"
+
+    def process(self, output: Iterable[str]) -> str:
+        return "\n".join(output)
+
+
+class CargoCrates(FactBase):
+    """
+    Returns the crates installed with ``cargo install`` (or cargo-binstall), as
+    a dict of name -> {"version": ..., "source": ..., "binaries": [...]}, read
+    from cargo's own record of them, ``$CARGO_HOME/.crates2.json``.
+    """
+
+    cache_files = ("${CARGO_HOME:-$HOME/.cargo}/.crates2.json",)
+
+    def command(self) -> str:
+        return 'cat "${CARGO_HOME:-$HOME/.cargo}/.crates2.json" 2>/dev/null || true'
+
+    def process(self, output: Iterable[str]) -> dict[str, dict[str, Any]]:
+        crates = {}
+        # Keyed by package id: "<name> <version> (<source>)"
+        for package_id, install in json.loads("\n".join(output))["installs"].items():
+            name, version, source = package_id.split(" ", 2)
+            crates[name] = {
+                "version": version,
+                "source": source.strip("()"),
+                "binaries": install.get("bins", []),
+            }
+        return crates
+
+    @staticmethod
+    def default() -> dict[str, dict[str, Any]]:
+        return {}
+
 
 class BunGlobalPackages(FactBase):
     """
     Returns a list of globally installed Bun packages.
     """
 
+    cache_files = ("${BUN_INSTALL:-$HOME/.bun}/install/global/package.json",)
+
     def command(self) -> str:
         return "bun pm ls --global 2>/dev/null || true"
 
@@ -193,3 +676,248 @@ class BunGlobalPackages(FactBase):
     def default() -> dict:
         # Return empty dict as default if fact collection fails
         return {}
+
+
+class Kernel(server.Kernel):
+    """
+    pyinfra's Kernel, cached across runs.
+    """
+
+    cache_ttl = 30 * 24 * 60 * 60
+
+
+class LsbRelease(server.LsbRelease):
+    """
+    pyinfra's LsbRelease, cached until the release files change.
+    Linux-only.
+    """
+
+    cache_files = ("/etc/lsb-release", "/etc/os-release")
+
+
+class OsRelease(server.OsRelease):
+    """
+    pyinfra's OsRelease, cached until the release file changes.
+    Linux-only.
+    """
+
+    cache_files = ("/etc/os-release",)
+
+
+class CompositeFact(FactBase):
+    """
+    Runs several fact commands in a single shell script (one round trip) and
+    returns each one's exit status and output lines, in order.
+    Used by gather_facts.
+    """
+
+    def command(self, commands: tuple[str, ...]) -> str:
+        return "; ".join(
+            f"( {command} ); printf '\\n{COMPOSITE_FACT_DELIMITER} %s\\n' $?"
+            for command in commands
+        )
+
+    def process(self, output: Iterable[str]) -> list[tuple[int, list[str]]]:
+        results = []
+        lines: list[str] = []
+        for line in output:
+            if not line.startswith(COMPOSITE_FACT_DELIMITER):
+                lines.append(line)
+                continue
+            # Drop the newline the delimiter is printed after
+            if lines and not lines[-1]:
+                lines.pop()
+            results.append((int(line.split()[1]), lines))
+            lines = []
+        return results
+
+    @staticmethod
+    def default() -> list:
+        return []
+
+
+def _fact_key(cls, args: tuple, kwargs: dict) -> tuple:
+    arguments = inspect.signature(cls().command).bind(*args, **kwargs).arguments
+    return cls, tuple(sorted(arguments.items()))
+
+
+def _fact_command(fact: FactBase, args: tuple) -> str:
+    """A fact's command as pyinfra would run it, as a plain string."""
+    command = fact.command(*args) if callable(fact.command) else fact.command
+    if isinstance(command, StringCommand):
+        command = command.get_raw_value()
+
+    requires_command = fact.requires_command(*args)
+    if requires_command:
+        # Same as pyinfra: a missing command means an empty (default) fact
+        command = f"! command -v {requires_command} >/dev/null || {{ {command}; }}"
+    return command
+
+
+def _is_cached(cls) -> bool:
+    """Whether a fact declares a cache_ttl and/or cache_files (see gather_facts)."""
+    return bool(getattr(cls, "cache_ttl", None) or getattr(cls, "cache_files", None))
+
+
+def _host_fact_cache() -> dict[str, dict]:
+    global _fact_cache
+    fact_cache = _fact_cache
+    if fact_cache is None:
+        try:
+            fact_cache = json.loads(FACT_CACHE_FILE.read_text())
+        except (OSError, ValueError):
+            fact_cache = {}
+        _fact_cache = fact_cache
+    return fact_cache.setdefault(host.name, {})
+
+
+def _save_fact_cache() -> None:
+    try:
+        FACT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = FACT_CACHE_FILE.with_suffix(f".{os.getpid()}")
+        temp_file.write_text(json.dumps(_fact_cache))
+        temp_file.replace(FACT_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def _cache_key(key: tuple) -> str:
+    cls, arguments = key
+    return f"{cls.name} {json.dumps(arguments)}"
+
+
+def _signature_command(files: tuple[str, ...], requires_command: str | None) -> str:
+    """
+    Checksum of cache_files (file contents, or the listing of directories) and
+    of where the fact's required command is, so installing it counts as a change.
+    cache_files are shell words, expanded on the host like the fact's command.
+    """
+    return (
+        f"{{ command -v {requires_command or 'true'};"
+        f" for f in {' '.join(files)}; do"
+        ' cat "$f" 2>/dev/null || ls -la "$f" 2>/dev/null; done; } | cksum'
+    )
+
+
+def gather_facts(*facts) -> None:
+    """
+    Load facts for the current host in one round trip, for get_fact to answer.
+
+    Every fact is a fact class or a ``(fact class, *args)`` tuple, as passed to
+    host.get_fact: ``gather_facts(UserGroups, (File, "/etc/apt/keyrings/x.gpg"))``.
+    Their commands run as one script (see CompositeFact) and each output goes to
+    its own fact's process(). Facts whose command fails are left out, so get_fact
+    loads them on their own and pyinfra reports the error as usual.
+
+    Facts declaring ``cache_ttl`` (seconds) and/or ``cache_files`` are also kept
+    in FACT_CACHE_FILE across runs. An entry is used until its TTL runs out, and
+    while the checksum of its cache_files is unchanged: that check runs in the
+    same script, which only runs the fact's own command when they changed.
+    Operations that change a cached fact some other way call invalidate_facts.
+    """
+    gathered = _gathered.setdefault(host.name, {})
+    cache = _host_fact_cache()
+    pending = []
+    commands = []
+
+    for fact in facts:
+        cls, *args = fact if isinstance(fact, tuple) else (fact,)
+        # Short facts are derived from another fact's value, gather that one
+        if issubclass(cls, ShortFactBase):
+            cls = cls.fact
+        key = _fact_key(cls, tuple(args), {})
+
+        cached = cache.get(_cache_key(key)) if _is_cached(cls) else None
+        ttl = getattr(cls, "cache_ttl", None)
+        if cached and ttl and time.time() - cached["time"] > ttl:
+            cached = None
+
+        files = getattr(cls, "cache_files", ())
+        if cached and not files:
+            gathered[key] = cached["value"]
+            continue
+
+        instance = cls()
+        command = _fact_command(instance, tuple(args))
+        if files:
+            signature = shlex.quote(cached["signature"]) if cached else "''"
+            requires_command = instance.requires_command(*args)
+            command = (
+                f'sig=$({_signature_command(files, requires_command)}); echo "$sig";'
+                f' [ "$sig" != {signature} ] || exit {CACHE_HIT_STATUS}; {command}'
+            )
+
+        pending.append((instance, key, cached, files))
+        commands.append(command)
+
+    results = host.get_fact(CompositeFact, commands=tuple(commands)) if commands else []
+
+    for (instance, key, cached, files), (status, lines) in zip(pending, results):
+        signature = None
+        if files:
+            signature, lines = (lines[0] if lines else ""), lines[1:]
+            if cached and status == CACHE_HIT_STATUS:
+                gathered[key] = cached["value"]
+                continue
+
+        if status != 0:
+            continue
+
+        value = instance.process(lines) if lines else instance.default()
+        gathered[key] = value
+
+        # Default values aren't kept: an empty output can just as well mean the
+        # fact's command isn't installed yet, which cache_files can't tell
+        if _is_cached(key[0]) and lines:
+            entry = {"value": value, "time": time.time(), "signature": signature}
+            try:
+                cache[_cache_key(key)] = json.loads(json.dumps(entry))
+            except TypeError:
+                # Not JSON serializable (sets, datetimes, ...), just don't keep it
+                pass
+
+    if pending:
+        _save_fact_cache()
+
+
+def invalidate_facts(*facts) -> None:
+    """
+    Drop the current host's cached values of these fact classes.
+
+    Call next to an operation that changes what a cached fact reports in a way
+    its cache_files don't show (``usermod -aG docker`` and UserGroups, say), so
+    the next run loads it again. Values already gathered for this run are kept,
+    the deploy code runs before any operation does.
+    """
+    names = {cls.name for cls in facts}
+    cache = _host_fact_cache()
+    for cache_key in [key for key in cache if key.split(" ", 1)[0] in names]:
+        del cache[cache_key]
+    _save_fact_cache()
+
+
+def get_fact(cls, *args, **kwargs):
+    """
+    host.get_fact, answered from what gather_facts loaded when possible.
+
+    Only used while preparing: the deploy code runs before any operation
+    changes the host, while operation code runs between changes and always
+    asks the host. Cached facts that weren't gathered yet are gathered here.
+    """
+    if issubclass(cls, ShortFactBase):
+        return cls().process_data(get_fact(cls.fact, *args, **kwargs))
+
+    if not host.state.is_executing:
+        try:
+            key = _fact_key(cls, args, kwargs)
+        except TypeError:
+            # Global arguments (_sudo, ...) change how the fact runs
+            key = None
+
+        gathered = _gathered.setdefault(host.name, {})
+        if key and not kwargs and key not in gathered and _is_cached(cls):
+            gather_facts((cls, *args))
+        if key in gathered:
+            return gathered[key]
+
+    return host.get_fact(cls, *args, **kwargs)
@@ -0,0 +1,218 @@
+"""
+julia.py - PyInfra operations for Julia packages.
+
+Every ``julia`` launch pays for startup, loading the registries and a resolve,
+so these operations check what's installed from the environment's TOML files
+(see facts.JuliaPackages) and only start Julia when there's work to do, once.
+julia.sysimage goes further and bakes the packages into a custom sysimage, so
+loading them costs next to nothing.
+
+Usage:
+------
+```python
+import julia
+
+julia.packages(
+    name="Install Julia packages",
+    packages=["Plots", "Revise", "BenchmarkTools"],
+    julia="/home/user/.juliaup/bin/julia",
+)
+
+julia.sysimage(
+    name="Build Julia sysimage",
+    packages=["Plots", "Pluto"],
+    path="/home/user/.julia/sysimages/workstation.so",
+    julia="/home/user/.juliaup/bin/julia",
+    juliaup="/home/user/.juliaup/bin/juliaup",
+)
+```
+"""
+
+import hashlib
+import json
+import posixpath
+import shlex
+
+from pyinfra.api.exceptions import OperationError
+from pyinfra.api.operation import operation
+from pyinfra.context import host
+
+from facts import JuliaPackages, JuliaSysimageStamp, JuliaupConfig
+
+# juliaup channel julia.sysimage links its sysimage to and makes the default
+SYSIMAGE_CHANNEL = "sysimage"
+
+# What the sysimage build runs, so the first-use paths are compiled in too
+# (packages without an entry are just loaded)
+SYSIMAGE_WORKLOADS = {
+    "Plots": 'using Plots; savefig(plot(1:10), tempname() * ".png")',
+    "Pluto": "using Pluto; Pluto.ServerSession()",
+    "DifferentialEquations": (
+        "using DifferentialEquations;"
+        " solve(ODEProblem((u, p, t) -> -u, 1.0, (0.0, 1.0)))"
+    ),
+    "BenchmarkTools": "using BenchmarkTools; @benchmark sum(rand(100)) samples=10",
+}
+
+
+def _julia_command(
+    julia: str, code: str, precompile_tasks: int | None, channel: str | None = None
+) -> str:
+    """Run `code` in a single Julia process, precompiling on all cores by default."""
+    tasks = precompile_tasks or "$(getconf _NPROCESSORS_ONLN)"
+    channel_arg = f" +{channel}" if channel else ""
+    return (
+        f"JULIA_NUM_PRECOMPILE_TASKS={tasks} {shlex.quote(julia)}{channel_arg}"
+        f" --startup-file=no -e {shlex.quote(code)}"
+    )
+
+
+@operation()
+def packages(packages: list[str], julia="julia", precompile_tasks=None):
+    """
+    Add packages to the default Julia environment with a single ``Pkg.add``.
+
+    The wanted packages are diffed against the environment's Project.toml, so
+    Julia only starts when something is missing, and then adds all of it in one
+    resolve and one parallel precompile.
+
+    Args:
+        packages: Names of the packages to ensure are in the environment.
+        julia: Path to the julia binary (juliaup's isn't always on the PATH).
+        precompile_tasks: Packages precompiled in parallel
+                         (JULIA_NUM_PRECOMPILE_TASKS, default: every core).
+
+    Example:
+        ```python
+        julia.packages(
+            name="Install Julia packages",
+            packages=["Plots", "Pluto"],
+            julia=str(HOME / ".juliaup" / "bin" / "julia"),
+        )
+        ```
+    """
+    installed = host.get_fact(JuliaPackages)
+    missing = [package for package in packages if package not in installed]
+
+    if not missing:
+        host.noop("all Julia packages are installed")
+        return
+
+    # JSON string arrays are valid Julia vector literals
+    code = f"using Pkg; Pkg.add({json.dumps(missing)})"
+    yield _julia_command(julia, code, precompile_tasks)
+
+
+def _sysimage_workload(packages: list[str]) -> str:
+    return "".join(
+        SYSIMAGE_WORKLOADS.get(package, f"using {package}") + "\n"
+        for package in packages
+    )
+
+
+@operation()
+def sysimage(
+    packages: list[str],
+    path: str,
+    julia="julia",
+    juliaup="juliaup",
+    channel="release",
+    precompile_tasks=None,
+):
+    """
+    Build a sysimage with ``packages`` baked in and make it juliaup's default.
+
+    PackageCompiler (in a temporary environment, so the default one stays as
+    it is) compiles the packages of the default environment into ``path``,
+    running SYSIMAGE_WORKLOADS while it does. The sysimage is linked to the
+    juliaup channel SYSIMAGE_CHANNEL, which runs the same Julia as ``channel``
+    with ``--sysimage``, and that channel becomes the default.
+
+    What it was built from (Julia version, package versions, workload) is
+    stamped next to it, so it's only rebuilt when one of those changes, e.g.
+    after juliaup updates ``channel``. Packages in a sysimage can't be updated
+    or revised without rebuilding, so leave out the ones you work on.
+
+    Args:
+        packages: Packages to bake in, already in the default environment.
+        path: Where to write the sysimage.
+        julia: Path to juliaup's julia launcher.
+        juliaup: Path to the juliaup binary.
+        channel: juliaup channel whose Julia builds and runs the sysimage.
+        precompile_tasks: Packages precompiled in parallel
+                         (JULIA_NUM_PRECOMPILE_TASKS, default: every core).
+    """
+    juliaup_config = host.get_fact(JuliaupConfig)
+    if juliaup_config is None:
+        raise OperationError("juliaup isn't installed")
+
+    config = juliaup_config["config"]
+    version = config.get("InstalledChannels", {}).get(channel, {}).get("Version")
+    if version is None:
+        raise OperationError(f"juliaup channel {channel} isn't installed")
+    binary = posixpath.join(
+        juliaup_config["dir"],
+        config["InstalledVersions"][version]["Path"],
+        "bin",
+        "julia",
+    )
+
+    installed = host.get_fact(JuliaPackages)
+    packages = [package for package in packages if package in installed]
+    if not packages:
+        host.noop("none of the sysimage packages are installed")
+        return
+
+    workload = _sysimage_workload(packages)
+    stamp = json.dumps(
+        {
+            "julia": version,
+            "packages": {
+                package: installed[package]["version"] for package in packages
+            },
+            "workload": hashlib.sha256(workload.encode()).hexdigest()[:16],
+        },
+        sort_keys=True,
+    )
+
+    linked = config["InstalledChannels"].get(SYSIMAGE_CHANNEL, {})
+    is_linked = (
+        config.get("Default") == SYSIMAGE_CHANNEL
+        and linked.get("Command") == binary
+        and f"--sysimage={path}" in linked.get("Args", [])
+    )
+
+    if host.get_fact(JuliaSysimageStamp, path=path) != stamp:
+        # Built next to the old one and moved over it, so a failed build leaves
+        # the current sysimage (and the channel using it) alone
+        new_path = f"{path}.new"
+        code = (
+            'using Pkg; project = dirname(Base.load_path_expand("@v#.#"));'
+            ' Pkg.activate(; temp=true); Pkg.add("PackageCompiler");'
+            " using PackageCompiler;"
+            f" create_sysimage({json.dumps(packages)}; project,"
+            f" sysimage_path={json.dumps(new_path)},"
+            " precompile_execution_file=ARGS[1])"
+        )
+        yield (
+            f"mkdir -p {shlex.quote(posixpath.dirname(path))}"
+            " && workload=$(mktemp)"
+            f' && printf %s {shlex.quote(workload)} > "$workload"'
+            f" && {_julia_command(julia, code, precompile_tasks, channel)}"
+            ' "$workload"'
+            f" && mv {shlex.quote(new_path)} {shlex.quote(path)}"
+            f" && printf %s {shlex.quote(stamp)} > {shlex.quote(path + '.stamp')};"
+            ' status=$?; rm -f "$workload"; exit $status'
+        )
+    elif is_linked:
+        host.noop("Julia sysimage is up to date")
+        return
+
+    yield (
+        # juliaup won't remove the default channel or link over an existing one
+        f"{shlex.quote(juliaup)} default {channel}"
+        f" && {{ {shlex.quote(juliaup)} remove {SYSIMAGE_CHANNEL} >/dev/null 2>&1 || true; }}"
+        f" && {shlex.quote(juliaup)} link {SYSIMAGE_CHANNEL} {shlex.quote(binary)}"
+        f" -- --sysimage={shlex.quote(path)}"
+        f" && {shlex.quote(juliaup)} default {SYSIMAGE_CHANNEL}"
+    )
@@ -1,24 +1,14 @@
 #!/usr/bin/env python3
 """
 Main deployment script that ties all modules together.
+
+Set DEPLOYS to run only some deploys (see deploys.DEPLOYS), e.g.
+``DEPLOYS=setup_fish pyinfra @local main.py``: only their modules are imported.
+Such runs skip the up-front gather_facts (their facts load as they're asked
+for), and either way the run ends with deploys.finish.
 """
 
-from config import is_linux, settings
-from env_setup import (
-    setup_directories,
-    setup_fish,
-    setup_python_env,
-)
-from gnome import configure_keyboard, configure_wallpaper
-from packages import (
-    install_claude_code,
-    install_cuda,
-    install_ghostty,
-    install_julia,
-    install_kinto,
-    install_mathematica,
-    setup_repositories_and_install_packages,
-)
+import deploys
 
 """
 Main deployment function that orchestrates all setup tasks.
@@ -29,27 +19,48 @@ Order is important:
     4. Apply Linux-specific configurations.
     5. Finally, apply dotfiles.
 """
-# 1. System repositories and base packages.
-setup_repositories_and_install_packages()
-
-# 2. Base directories and shell environment.
-setup_directories()
-setup_fish()
-setup_python_env()
-install_julia()
-
-# 3. Install additional tools (install_docker and install_firefox_dev are already handled)
-install_claude_code()  # Install Claude Code CLI (works on both platforms)
-
-# 4. Linux-specific configurations.
-if is_linux():
-    install_cuda()
-    configure_wallpaper()  # GUI check happens inside the function
-    configure_keyboard()  # GUI check happens inside the function
-    install_kinto()  # GUI check happens inside the function
-    install_mathematica()  # GUI check happens inside the function
-    install_ghostty()  # GUI check happens inside the function
-
-# Output testing status
-if settings.docker_testing:
-    print("\nExecuting in Docker testing mode - GUI modules skipped")
+if deploys.selected():
+    deploys.run(*deploys.selected())
+else:
+    from pyinfra.facts.server import HasGui
+
+    from config import is_linux, settings
+    from facts import Kernel, UvInstallation, gather_facts
+    from packages import DEPLOY_FACTS
+
+    # Load what the deploys below check in one round trip, instead of one per fact
+    gather_facts(Kernel, HasGui, UvInstallation, *DEPLOY_FACTS)
+
+    # 1. System repositories and base packages.
+    deploys.run("setup_repositories_and_install_packages")
+
+    # 2. Base directories and shell environment.
+    deploys.run(
+        "setup_directories",
+        "setup_fish",
+        "setup_python_env",
+        "install_julia",
+    )
+
+    # 3. Install additional tools (install_docker and install_firefox_dev are already handled)
+    # Install Claude Code CLI (works on both platforms)
+    deploys.run("install_claude_code")
+
+    # 4. Linux-specific configurations.
+    if is_linux():
+        # GUI checks happen inside the functions from configure_wallpaper on
+        deploys.run(
+            "install_cuda",
+            "configure_wallpaper",
+            "configure_keyboard",
+            "install_kinto",
+            "install_mathematica",
+            "install_ghostty",
+        )
+
+    # Output testing status
+    if settings.docker_testing:
+        print("\nExecuting in Docker testing mode - GUI modules skipped")
+
+# Single fsync barrier and brew cleanup, for full and DEPLOYS runs alike
+deploys.finish()
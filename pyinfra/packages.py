@@ -11,18 +11,21 @@ Most development tools are installed via Homebrew (Linuxbrew on Linux) using a c
 Other operations (e.g. adding apt repositories, flatpak installs) are handled separately.
 """
 
-import itertools
 from io import StringIO
 from pathlib import Path
 
 from pyinfra.api.deploy import deploy
-from pyinfra.context import host
 from pyinfra.facts.files import Directory, File
-from pyinfra.facts.server import LsbRelease, OsRelease
-from pyinfra.operations import apt, brew, files, flatpak, server, snap
+from pyinfra.operations import apt, brew, files, server
+from pyinfra.operations.util import any_changed
 
 # Import our apt-fast module for faster parallel downloads
 import apt_fast
+import brew_fast
+import cargo
+import flatpak_fast
+import julia
+import snap_fast
 from config import BREW_PATH, HOME, USER, has_display, is_linux, is_macos, settings
 from facts import (
     BunGlobalPackages,
@@ -30,9 +33,39 @@ from facts import (
     DockerConfiguration,
     FlatpakRemotes,
     KernelParameters,
+    LsbRelease,
+    OsRelease,
     UserGroups,
+    get_fact,
+    invalidate_facts,
 )
 
+# Facts the deploys below check while preparing, loaded up front in one round
+# trip by main.py (see facts.gather_facts). Anything missing here still works,
+# it's just fetched on its own.
+DEPLOY_FACTS = [
+    LsbRelease,
+    OsRelease,
+    UserGroups,
+    KernelParameters,
+    DockerConfiguration,
+    DebsigPolicies,
+    FlatpakRemotes,
+    BunGlobalPackages,
+    (File, f"{HOME}/.juliaup/bin/julia"),
+    (File, f"{HOME}/.cargo/bin/rustup"),
+    (File, "/etc/apt/keyrings/insync.gpg"),
+    (File, "/etc/apt/keyrings/docker.asc"),
+    (File, "/usr/share/keyrings/1password-archive-keyring.gpg"),
+    (File, f"{HOME}/.local/share/applications/firefox-dev.desktop"),
+    (File, f"{HOME}/repos/claude-desktop-debian/claude-desktop_0.7.7_amd64.deb"),
+    (Directory, str(BREW_PATH)),
+    (Directory, "/home/linuxbrew"),
+    (Directory, "/opt/firefox-dev"),
+    (Directory, f"{HOME}/repos/kinto"),
+    (Directory, f"{HOME}/repos/claude-desktop-debian"),
+]
+
 
 @deploy("Install Julia and Packages")
 def install_julia() -> None:
@@ -45,7 +78,7 @@ def install_julia() -> None:
     julia_path = HOME / ".juliaup" / "bin" / "julia"
 
     # Install Julia if not already installed
-    if not host.get_fact(File, str(julia_path)):
+    if not get_fact(File, str(julia_path)):
         server.shell(
             name="Install Julia",
             commands=["curl -fsSL https://install.julialang.org | sh -s -- --yes"],
@@ -63,14 +96,37 @@ def install_julia() -> None:
         # "PyCall",  # Removed due to installation issues with newer Julia versions
     ]
 
-    # Install Julia packages
-    for pkg in julia_packages:
-        server.shell(
-            name=f"Install Julia package {pkg}",
-            commands=[f"{julia_path} -e 'using Pkg; Pkg.add(\"{pkg}\")'"],
+    # Install the missing ones in one Julia process (none if all are there)
+    julia.packages(
+        name="Install Julia packages",
+        packages=julia_packages,
+        julia=str(julia_path),
+    )
+
+    # Optionally compile them into a sysimage, for a fast time-to-first-plot
+    if settings.julia_sysimage:
+        sysimage_ext = "dylib" if is_macos() else "so"
+        julia.sysimage(
+            name="Build Julia sysimage",
+            packages=julia_packages,
+            path=str(HOME / ".julia" / "sysimages" / f"workstation.{sysimage_ext}"),
+            julia=str(julia_path),
+            juliaup=str(HOME / ".juliaup" / "bin" / "juliaup"),
         )
 
 
+@deploy("Select Fastest APT Mirrors")
+def select_apt_mirrors() -> None:
+    """Move apt to the fastest archive mirror and let apt-fast download from several."""
+    apt_fast.mirrors(
+        name="Select fastest APT mirrors",
+        mirrors=settings.apt_mirrors,
+        count=3,
+        parallel=16,
+        _sudo=True,
+    )
+
+
 @deploy("Setup Package Repositories")
 def setup_repositories() -> None:
     """Set up package repositories for the system."""
@@ -93,8 +149,16 @@ def setup_repositories() -> None:
             _sudo=True,
         )
 
+        # Lets apt_fast skip fsync for every write, not just dpkg's unpacking
+        if settings.apt_unsafe_io:
+            apt.packages(
+                name="Ensure eatmydata is installed",
+                packages=["eatmydata"],
+                _sudo=True,
+            )
+
         # Download key ACCAF35C from ubuntu pgp, dearmor and then add signed-by
-        if not host.get_fact(File, "/etc/apt/keyrings/insync.gpg"):
+        if not get_fact(File, "/etc/apt/keyrings/insync.gpg"):
             server.shell(
                 name="Add Insync GPG key",
                 commands=[
@@ -104,7 +168,7 @@ def setup_repositories() -> None:
                 _sudo=True,
             )
 
-        codename = host.get_fact(LsbRelease)["codename"]
+        codename = get_fact(LsbRelease)["codename"]
         apt.repo(
             name="Add Insync repository",
             src=(
@@ -114,6 +178,10 @@ def setup_repositories() -> None:
             _sudo=True,
         )
 
+        # After the repositories, so a mirror switch's index refresh covers them
+        # and stamps the cached update below
+        select_apt_mirrors()
+
         # Use apt-fast for update and upgrade operations with 16 parallel downloads
         apt_fast.update(
             name="Update apt repositories", cache_time=3600, parallel=16, _sudo=True
@@ -127,11 +195,11 @@ def setup_repositories() -> None:
 def setup_brew() -> None:
     """Set up Homebrew for package management."""
     # Check if brew is installed
-    if not host.get_fact(Directory, str(BREW_PATH)):
+    if not get_fact(Directory, str(BREW_PATH)):
         if is_linux():
             # First ensure the /home/linuxbrew directory exists with correct permissions
             # Create the directory as root and then set appropriate permissions
-            if not host.get_fact(Directory, "/home/linuxbrew"):
+            if not get_fact(Directory, "/home/linuxbrew"):
                 server.shell(
                     name="Create /home/linuxbrew directory with proper permissions",
                     commands=[
@@ -162,23 +230,35 @@ def setup_brew() -> None:
                 _sudo_user=USER,
             )
 
+    # Shared download cache (HOMEBREW_CACHE in brew_fast.BREW_ENV), owned by the
+    # user since brew runs as them
+    files.directory(
+        name="Create Homebrew cache directory",
+        path=brew_fast.BREW_CACHE_DIR,
+        user=USER,
+        _sudo=True,
+    )
+
+    # The only `brew update` of the run (brew_fast.BREW_ENV disables the rest)
+    brew_fast.update(name="Update Homebrew", _env=brew_fast.BREW_ENV)
+
     # Set up taps based on platform
     if is_linux():
         brew.tap(
             name="Tap linuxbrew/fonts",
             src="linuxbrew/fonts",
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
     elif is_macos():
         brew.tap(
             name="Tap homebrew/core",
             src="homebrew/core",
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
         brew.tap(
             name="Tap homebrew/cask-fonts",
             src="homebrew/cask-fonts",
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -214,18 +294,18 @@ def install_dev_tools() -> None:
             name="Install development tools (APT)",
             packages=dev_tools["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
 
     # Install Brew packages for dev tools on both platforms
-    # Install in batches to prevent triggering open file limits
-    for i, packages in enumerate(itertools.batched(dev_tools["brew"], 5)):
-        brew.packages(
-            name=f"Install dev tools (Brew batch #{i})",
-            packages=packages,
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
-        )
+    # Batched by brew_fast from the open file limit, bottles fetched concurrently
+    brew_fast.packages(
+        name="Install dev tools (Brew)",
+        packages=dev_tools["brew"],
+        _env=brew_fast.BREW_ENV,
+    )
 
 
 @deploy("Install Shell Tools")
@@ -252,18 +332,18 @@ def install_shell_tools() -> None:
             name="Install shell tools (APT)",
             packages=shell_tools["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
 
     # Install Brew packages for shell tools on both platforms
-    # Install in batches to prevent triggering open file limits
-    for i, packages in enumerate(itertools.batched(shell_tools["brew"], 5)):
-        brew.packages(
-            name=f"Install shell tools (Brew batch #{i})",
-            packages=packages,
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
-        )
+    # Batched by brew_fast from the open file limit, bottles fetched concurrently
+    brew_fast.packages(
+        name="Install shell tools (Brew)",
+        packages=shell_tools["brew"],
+        _env=brew_fast.BREW_ENV,
+    )
 
 
 @deploy("Install Build Tools")
@@ -307,15 +387,16 @@ def install_build_tools() -> None:
             name="Install build tools (APT)",
             packages=build_tools["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
 
     # Install Brew packages for build tools on both platforms
-    brew.packages(
+    brew_fast.packages(
         name="Install build tools (Brew)",
         packages=build_tools["brew"],
-        _env={"PATH": f"{BREW_PATH}:$PATH"},
+        _env=brew_fast.BREW_ENV,
     )
 
 
@@ -333,17 +414,22 @@ def install_programming_languages() -> None:
             name="Install programming languages (APT)",
             packages=programming_languages["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
 
     # Install Brew packages for programming languages on both platforms
-    brew.packages(
+    brew_fast.packages(
         name="Install programming languages (Brew)",
         packages=programming_languages["brew"],
-        _env={"PATH": f"{BREW_PATH}:$PATH"},
+        _env=brew_fast.BREW_ENV,
     )
 
+    # Rust and Julia need the compilers and libraries deferred so far
+    if is_linux() and apt_fast.coalescing():
+        apt_fast.flush(name="Install deferred APT packages", parallel=16, _sudo=True)
+
     # Install Rust (specific language installation that needs special handling)
     install_rust()
 
@@ -396,15 +482,16 @@ def install_system_utilities() -> None:
             name="Install system utilities (APT)",
             packages=system_utilities["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
 
     # Install Brew packages for system utilities on both platforms
-    brew.packages(
+    brew_fast.packages(
         name="Install system utilities (Brew)",
         packages=system_utilities["brew"],
-        _env={"PATH": f"{BREW_PATH}:$PATH"},
+        _env=brew_fast.BREW_ENV,
     )
 
 
@@ -458,11 +545,12 @@ def install_gui_apps() -> None:
             name="Install GUI applications (APT)",
             packages=gui_apps["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             _sudo=True,
         )
 
         # Install Flatpak apps if flatpak is available
-        flatpak_remotes = host.get_fact(FlatpakRemotes)
+        flatpak_remotes = get_fact(FlatpakRemotes)
 
         # Check if flatpak is available
         if flatpak_remotes is None:
@@ -475,7 +563,7 @@ def install_gui_apps() -> None:
                 _sudo=True,
             )
             # Retry getting flatpak remotes
-            flatpak_remotes = host.get_fact(FlatpakRemotes)
+            flatpak_remotes = get_fact(FlatpakRemotes)
 
         # Add flathub remote if flatpak is available and flathub isn't configured
         if flatpak_remotes is not None and "flathub" not in flatpak_remotes:
@@ -489,7 +577,7 @@ def install_gui_apps() -> None:
 
         # Only try to install flatpak apps if flatpak is available
         if flatpak_remotes is not None:
-            flatpak.packages(
+            flatpak_fast.packages(
                 name="Install Flatpak packages",
                 packages=gui_apps["flatpak"],
                 _sudo=True,
@@ -507,8 +595,11 @@ def install_gui_apps() -> None:
             _sudo=True,
         )
 
-        for snap_app in gui_apps["snap"]:
-            snap.package(name=f"Install {snap_app}", packages=snap_app, _sudo=True)
+        snap_fast.packages(
+            name="Install Snap packages",
+            packages=gui_apps["snap"],
+            _sudo=True,
+        )
 
         # Install Zoom
         apt_fast.deb(
@@ -519,10 +610,10 @@ def install_gui_apps() -> None:
         )
 
     elif is_macos():
-        brew.casks(
+        brew_fast.casks(
             name="Install GUI applications (Brew casks)",
             casks=gui_apps["brew_cask"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -543,6 +634,7 @@ def install_gaming_apps() -> None:
             name="Install gaming applications",
             packages=gaming["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             _sudo=True,
         )
 
@@ -568,6 +660,7 @@ def install_gnome_tools() -> None:
         name="Install GNOME tools",
         packages=gnome_tools["apt"],
         parallel=16,
+        coalesce=apt_fast.coalescing(),
         _sudo=True,
     )
 
@@ -585,6 +678,7 @@ def install_fonts() -> None:
             name="Install fonts (APT)",
             packages=fonts["apt"],
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             _sudo=True,
         )
 
@@ -604,8 +698,10 @@ def install_docker() -> None:
     ]
 
     if is_linux():
-        if not host.get_fact(File, "/etc/apt/keyrings/docker.asc"):
-            server.shell(
+        # Ops whose changes mean the Docker package list needs refreshing
+        repo_ops = []
+        if not get_fact(File, "/etc/apt/keyrings/docker.asc"):
+            add_key = server.shell(
                 name="Add Docker GPG key",
                 commands=[
                     "curl -fsSL https://download.docker.com/linux/ubuntu/gpg -o /etc/apt/keyrings/docker.asc",
@@ -613,34 +709,49 @@ def install_docker() -> None:
                 ],
                 _sudo=True,
             )
-        codename = host.get_fact(LsbRelease)["codename"]
-        apt.repo(
-            name="Add Docker repository",
-            src=(
-                "deb [arch=amd64 signed-by=/etc/apt/keyrings/docker.asc] "
-                f"https://download.docker.com/linux/ubuntu {codename} stable"
-            ),
+            repo_ops.append(add_key)
+        codename = get_fact(LsbRelease)["codename"]
+        docker_repo = (
+            "deb [arch=amd64 signed-by=/etc/apt/keyrings/docker.asc] "
+            f"https://download.docker.com/linux/ubuntu {codename} stable"
+        )
+        repo_ops.append(
+            apt.repo(name="Add Docker repository", src=docker_repo, _sudo=True)
+        )
+        # setup_repositories already refreshed everything else, including this
+        # repository when it was already there
+        apt_fast.update(
+            name="Update apt for Docker",
+            source=docker_repo,
+            parallel=16,
             _sudo=True,
+            _if=any_changed(*repo_ops),
         )
-        apt_fast.update(name="Update apt for Docker", parallel=16, _sudo=True)
         apt_fast.packages(
             name="Install Docker packages",
             packages=docker_packages,
             parallel=16,
+            coalesce=apt_fast.coalescing(),
             no_recommends=True,
             _sudo=True,
         )
-        if "docker" not in host.get_fact(UserGroups):
+        # The docker group only exists once docker-ce is actually installed
+        if apt_fast.coalescing():
+            apt_fast.flush(
+                name="Install deferred APT packages", parallel=16, _sudo=True
+            )
+        if "docker" not in get_fact(UserGroups):
             server.shell(
                 name="Add user to docker group",
                 commands=[f"usermod -aG docker {USER}"],
                 _sudo=True,
             )
+            invalidate_facts(UserGroups)
     elif is_macos():
-        brew.casks(
+        brew_fast.casks(
             name="Install Docker Desktop",
             casks=["docker"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -653,8 +764,8 @@ def install_firefox_dev() -> None:
     if is_linux():
         apps_dir = HOME / ".local/share/applications"
         if not (
-            host.get_fact(Directory, "/opt/firefox-dev")
-            and host.get_fact(File, f"{apps_dir}/firefox-dev.desktop")
+            get_fact(Directory, "/opt/firefox-dev")
+            and get_fact(File, f"{apps_dir}/firefox-dev.desktop")
         ):
             # Create the target directories
             files.directory(
@@ -716,10 +827,10 @@ def install_firefox_dev() -> None:
                 _sudo=True,
             )
     elif is_macos():
-        brew.casks(
+        brew_fast.casks(
             name="Install Firefox Developer Edition",
             casks=["firefox-developer-edition"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -733,7 +844,7 @@ def install_rust() -> None:
     rustup_path = HOME / ".cargo" / "bin" / "rustup"
 
     # Install rustup if not already installed
-    if not host.get_fact(File, str(rustup_path)):
+    if not get_fact(File, str(rustup_path)):
         server.shell(
             name="Install Rust using rustup",
             commands=[
@@ -741,12 +852,23 @@ def install_rust() -> None:
             ],
         )
 
-    # Install cargo tools (now enabled in both regular and Docker environments)
-    server.shell(
+    # Compile cache for whatever cargo tools have to be built from source
+    files.directory(
+        name="Create sccache directory",
+        path=cargo.SCCACHE_DIR,
+        user=USER,
+        _sudo=True,
+    )
+
+    # Install cargo tools (now enabled in both regular and Docker environments),
+    # prebuilt where possible and only when missing
+    cargo.tools(
         name="Install Cargo tools",
-        commands=[
-            f"bash -c 'source {HOME}/.cargo/env && cargo install cargo-edit cargo-update --force'",
-        ],
+        crates={"cargo-edit": None, "cargo-update": None},
+        jobs=settings.cargo_build_jobs,
+        sccache_dir=cargo.SCCACHE_DIR,
+        sccache_size=settings.sccache_cache_size,
+        _env={"PATH": f"{HOME}/.cargo/bin:$PATH"},
     )
 
 
@@ -762,7 +884,7 @@ def install_cuda() -> None:
     ]
 
     if is_linux():
-        os_release = host.get_fact(OsRelease) or {}
+        os_release = get_fact(OsRelease) or {}
         if "pop" in os_release.get("NAME", "").lower():
             # Install CUDA packages
             apt_fast.packages(
@@ -773,9 +895,7 @@ def install_cuda() -> None:
                 _sudo=True,
             )
 
-            if "systemd.unified_cgroup_hierarchy=0" not in host.get_fact(
-                KernelParameters
-            ):
+            if "systemd.unified_cgroup_hierarchy=0" not in get_fact(KernelParameters):
                 # Configure system for CUDA
                 server.shell(
                     name="Configure Unified Cgroup Hierarchy",
@@ -784,13 +904,14 @@ def install_cuda() -> None:
                     ],
                     _sudo=True,
                 )
-            docker_config = host.get_fact(DockerConfiguration)
+            docker_config = get_fact(DockerConfiguration)
             if "nvidia-container-runtime" not in docker_config.get("runtimes", {}):
                 server.shell(
                     name="Configure Docker for NVIDIA runtime",
                     commands=["nvidia-ctk runtime configure --runtime=docker"],
                     _sudo=True,
                 )
+                invalidate_facts(DockerConfiguration)
 
 
 @deploy("Install Mathematica")
@@ -825,7 +946,7 @@ def install_kinto() -> None:
     kinto_dir = HOME / "repos" / "kinto"
 
     # Clone the repository if it doesn't exist.
-    if not host.get_fact(Directory, str(kinto_dir)):
+    if not get_fact(Directory, str(kinto_dir)):
         server.shell(
             name="Clone Kinto repository",
             commands=[f"git clone https://github.com/rbreaves/kinto.git {kinto_dir}"],
@@ -845,10 +966,10 @@ def install_1password() -> None:
 
     if is_linux():
         try:
+            # Ops whose changes mean the 1Password package list needs refreshing
+            repo_ops = []
             # Try to check for existing GPG key
-            if not host.get_fact(
-                File, "/usr/share/keyrings/1password-archive-keyring.gpg"
-            ):
+            if not get_fact(File, "/usr/share/keyrings/1password-archive-keyring.gpg"):
                 # Create keyrings directory if it doesn't exist
                 files.directory(
                     name="Ensure keyrings directory exists",
@@ -866,7 +987,7 @@ def install_1password() -> None:
                 )
 
                 # Dearmor and save the key
-                server.shell(
+                convert_key = server.shell(
                     name="Convert 1Password GPG key",
                     commands=[
                         "gpg --dearmor < /tmp/1password.asc > /usr/share/keyrings/1password-archive-keyring.gpg",
@@ -875,26 +996,32 @@ def install_1password() -> None:
                     ],
                     _sudo=True,
                 )
+                repo_ops.append(convert_key)
 
             # Add 1Password repository
-            apt.repo(
-                name="Add 1Password repository",
-                src=(
-                    "deb [arch=amd64 signed-by=/usr/share/keyrings/1password-archive-keyring.gpg] "
-                    "https://downloads.1password.com/linux/debian/amd64 stable main"
-                ),
-                _sudo=True,
+            onepassword_repo = (
+                "deb [arch=amd64 signed-by=/usr/share/keyrings/1password-archive-keyring.gpg] "
+                "https://downloads.1password.com/linux/debian/amd64 stable main"
+            )
+            repo_ops.append(
+                apt.repo(
+                    name="Add 1Password repository",
+                    src=onepassword_repo,
+                    _sudo=True,
+                )
             )
 
-            # Update apt cache after adding repository
+            # Update apt cache for the new repository only, when it's new
             apt_fast.update(
                 name="Update apt cache for 1Password",
+                source=onepassword_repo,
                 parallel=16,
                 _sudo=True,
+                _if=any_changed(*repo_ops),
             )
 
             # Check if 1Password policy already exists
-            policies = host.get_fact(DebsigPolicies)
+            policies = get_fact(DebsigPolicies)
             # Handle None case explicitly - policies can be None in the Docker environment
             if policies is None or "AC2D62742012EA22" not in policies:
                 # Use directories first to ensure parent directories exist
@@ -961,10 +1088,10 @@ def install_1password() -> None:
             print("Continuing with other installations...")
             return
     elif is_macos():
-        brew.casks(
+        brew_fast.casks(
             name="Install 1Password",
             casks=["1password", "1password-cli"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -992,7 +1119,7 @@ def install_claude_desktop() -> None:
         
         if installed_check.stdout != "installed":
             # Clone the repository if it doesn't exist
-            if not host.get_fact(Directory, str(claude_desktop_dir)):
+            if not get_fact(Directory, str(claude_desktop_dir)):
                 # Create parent directory if needed
                 files.directory(
                     name="Create repos directory",
@@ -1016,13 +1143,14 @@ def install_claude_desktop() -> None:
             )
             
             # Build the .deb package
-            if not host.get_fact(File, str(deb_file)):
+            if not get_fact(File, str(deb_file)):
                 server.shell(
                     name="Build Claude Desktop package",
                     commands=[f"cd {claude_desktop_dir} && ./build-deb.sh"],
                 )
             
-            # Install the .deb package
+            # Install the .deb package, dpkg can't while apt downloads
+            apt_fast.wait_for_prefetch(name="Wait for APT downloads", _sudo=True)
             server.shell(
                 name="Install Claude Desktop package",
                 commands=[f"dpkg -i {deb_file}"],
@@ -1030,10 +1158,10 @@ def install_claude_desktop() -> None:
             )
     elif is_macos():
         # Install Claude Desktop via Homebrew
-        brew.casks(
+        brew_fast.casks(
             name="Install Claude Desktop",
             casks=["claude"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -1050,18 +1178,17 @@ def install_ghostty() -> None:
         
     if is_linux():
         # Install Ghostty via snap (simplest cross-distro option)
-        snap.package(
+        snap_fast.packages(
             name="Install Ghostty Terminal",
-            packages="ghostty",
-            classic=True,
+            classic=["ghostty"],
             _sudo=True,
         )
     elif is_macos():
         # Install Ghostty via Homebrew
-        brew.casks(
+        brew_fast.casks(
             name="Install Ghostty Terminal",
             casks=["ghostty"],
-            _env={"PATH": f"{BREW_PATH}:$PATH"},
+            _env=brew_fast.BREW_ENV,
         )
 
 
@@ -1074,7 +1201,7 @@ def install_claude_code() -> None:
     The executable is called 'claude' (not 'claude-code').
     """
     # Check if Claude Code is already installed using our custom fact
-    bun_packages = host.get_fact(BunGlobalPackages)
+    bun_packages = get_fact(BunGlobalPackages)
     
     # Package name for Claude Code in bun
     claude_package_name = "@anthropic-ai/claude-code"
@@ -1106,10 +1233,21 @@ def setup_repositories_and_install_packages() -> None:
     """
     Main function that sets up repositories and installs all packages.
     This calls the individual specialized functions in the correct order.
+
+    On Linux the leaf apt installs are deferred while the prefetch downloads them
+    (and with APT_COALESCE=1 anyway), and flushed in a few transactions (before
+    Rust/Julia, before the docker group, and at the end).
     """
     # Setup repositories first
     setup_repositories()
 
+    # Download the APT packages of every deploy below in the background. The
+    # leaf installs are deferred to the flush before Rust/Julia (which need the
+    # compilers), so setup_brew and the Homebrew formulae of the deploys before
+    # it install meanwhile
+    if is_linux():
+        apt_fast.prefetch(name="Prefetch APT packages", parallel=16, _sudo=True)
+
     # Setup Homebrew
     setup_brew()
 
@@ -1134,3 +1272,7 @@ def setup_repositories_and_install_packages() -> None:
     install_docker()
     install_1password()
     install_claude_desktop()
+
+    # Catch anything deferred after the last barrier
+    if is_linux() and apt_fast.coalescing():
+        apt_fast.flush(name="Install deferred APT packages", parallel=16, _sudo=True)
@@ -0,0 +1,39 @@
+import os
+
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    mathematica_license_key: str | None = None
+    docker_testing: bool = os.environ.get("DOCKER_TESTING", "0") == "1"
+    # Defer leaf apt installs to a few coalesced transactions (see apt_fast.flush)
+    apt_coalesce: bool = os.environ.get("APT_COALESCE", "0") == "1"
+    # Run dpkg without fsync (see apt_fast.sync), on by default for throwaway containers
+    apt_unsafe_io: bool = (
+        os.environ.get("APT_UNSAFE_IO", os.environ.get("DOCKER_TESTING", "0")) == "1"
+    )
+    # Seconds a `brew update` is good for (brew_fast.update), 0 to always update
+    brew_update_ttl: int = int(os.environ.get("BREW_UPDATE_TTL", "86400"))
+    # Size cap of the shared Homebrew download cache, in MiB (brew_fast.cleanup)
+    brew_cache_max_mb: int = int(os.environ.get("BREW_CACHE_MAX_MB", "10240"))
+    # Size limit of the sccache cache cargo tools are compiled with (cargo.tools)
+    sccache_cache_size: str = os.environ.get("SCCACHE_CACHE_SIZE", "10G")
+    # Parallel rustc jobs for cargo tool builds (cargo.tools), default every core
+    cargo_build_jobs: int | None = (
+        int(os.environ["CARGO_BUILD_JOBS"])
+        if os.environ.get("CARGO_BUILD_JOBS")
+        else None
+    )
+    # Bake the Julia packages into a sysimage juliaup starts by default (julia.sysimage)
+    julia_sysimage: bool = os.environ.get("JULIA_SYSIMAGE", "0") == "1"
+    # Candidate Ubuntu archive mirrors for apt_fast.mirrors (APT_MIRRORS='["http://..."]')
+    apt_mirrors: list[str] = [
+        "http://archive.ubuntu.com/ubuntu",
+        "http://cl.archive.ubuntu.com/ubuntu",
+        "http://us.archive.ubuntu.com/ubuntu",
+        "http://mirrors.kernel.org/ubuntu",
+        "http://mirror.math.princeton.edu/pub/ubuntu",
+    ]
+
+
+settings = Settings()